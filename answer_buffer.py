@@ -0,0 +1,70 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+
+from async_db import store_answers
+
+
+class AnswerBuffer:
+    # Write-behind queue for /answer. Submissions are acknowledged right away and written in
+    # bulk every flush_interval_ms, or sooner once max_rows are waiting. A resubmission that
+    # arrives before its flush simply replaces the buffered row, so the latest answer wins.
+
+    def __init__(self, flush_interval_ms: int, max_rows: int):
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_rows = max_rows
+        self._pending = {}  # (question_id, user_id) -> (question_id, guild_id, user_id, answer, submitted_at)
+        self._lock = asyncio.Lock()
+        self._full = asyncio.Event()
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        # Stop the background flusher and write out whatever is still buffered
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def submit(self, question_id: int, guild_id: int, user_id: int, answer: str):
+        self._pending[(question_id, user_id)] = (question_id, guild_id, user_id, answer, datetime.now(timezone.utc))
+        if len(self._pending) >= self.max_rows:
+            self._full.set()
+
+    async def flush(self, question_id: int | None = None) -> bool:
+        # Write buffered answers (only those for question_id, if given); False if the write failed
+        async with self._lock:
+            keys = [key for key in self._pending if question_id is None or key[0] == question_id]
+            if not keys:
+                return True
+
+            rows = [self._pending.pop(key) for key in keys]
+            if await store_answers(rows):
+                return True
+
+            # Only transient failures get here, rows that can never be stored were dropped. Put
+            # the rest back for the next flush, unless the user has answered again since
+            for row in rows:
+                self._pending.setdefault((row[0], row[2]), row)
+            logging.error(f"Failed to flush {len(rows)} buffered answers, will retry.")
+            return False
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+
+            try:
+                await self.flush()
+            except Exception as e:
+                logging.error(f"Unexpected error while flushing answers: {e}", exc_info=True)
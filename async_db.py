@@ -0,0 +1,60 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+import db
+import metrics
+
+# Run blocking psycopg2 calls on a bounded set of worker threads so the event loop keeps
+# serving the gateway heartbeat and other interactions while a query is in flight.
+# The executor never has more workers than the pool has connections, so a worker never
+# finds the pool exhausted.
+executor = ThreadPoolExecutor(max_workers=db.POOL_MAX_CONNECTIONS, thread_name_prefix="db")
+
+
+def _run_in_executor(func):
+    # Wrap a synchronous db.py function in a coroutine with the same signature, timed in the
+    # worker thread when metrics are enabled
+    func = metrics.timed(metrics.DB_LATENCY, func.__name__, metrics.DB_ERRORS)(func)
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+    return wrapper
+
+
+# Async counterparts of every db.py function, same names and arguments
+init_db = _run_in_executor(db.init_db)
+get_discord_user = _run_in_executor(db.get_discord_user)
+store_discord_user = _run_in_executor(db.store_discord_user)
+set_trivia_channel = _run_in_executor(db.set_trivia_channel)
+set_trivia_role = _run_in_executor(db.set_trivia_role)
+get_all_guild_configs = _run_in_executor(db.get_all_guild_configs)
+get_guild_config = _run_in_executor(db.get_guild_config)
+get_channel_for_guild = _run_in_executor(db.get_channel_for_guild)
+store_question = _run_in_executor(db.store_question)
+store_questions = _run_in_executor(db.store_questions)
+get_question_texts = _run_in_executor(db.get_question_texts)
+pull_random_trivia = _run_in_executor(db.pull_random_trivia)
+get_active_question = _run_in_executor(db.get_active_question)
+store_answer = _run_in_executor(db.store_answer)
+store_answers = _run_in_executor(db.store_answers)
+mark_answer_correct = _run_in_executor(db.mark_answer_correct)
+get_expired_questions = _run_in_executor(db.get_expired_questions)
+get_open_expirations = _run_in_executor(db.get_open_expirations)
+get_answers_for_question = _run_in_executor(db.get_answers_for_question)
+update_leaderboard = _run_in_executor(db.update_leaderboard)
+close_question = _run_in_executor(db.close_question)
+finalize_question = _run_in_executor(db.finalize_question)
+get_leaderboard = _run_in_executor(db.get_leaderboard)
+get_leaderboard_page = _run_in_executor(db.get_leaderboard_page)
+get_rank = _run_in_executor(db.get_rank)
+get_user_stats = _run_in_executor(db.get_user_stats)
+
+
+def shutdown():
+    # Wait for in-flight queries to finish, then stop the worker threads and close the pool
+    executor.shutdown(wait=True)
+    if db.pool:
+        db.pool.closeall()
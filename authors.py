@@ -0,0 +1,56 @@
+import logging
+from datetime import datetime, timedelta, timezone
+
+import discord
+
+from async_db import get_discord_user, store_discord_user
+from cache import LRUCache
+import metrics
+
+UNKNOWN_AUTHOR = ("Unknown Author", None)
+
+
+class AuthorCache:
+    # Resolves a question author's display name and avatar for announcement embeds. Checks an
+    # in-process LRU first, then the discord_users table, and only calls Discord's rate-limited
+    # fetch_user when neither has a copy newer than the freshness window.
+
+    def __init__(self, client: discord.Client, max_size: int, freshness: timedelta):
+        self.client = client
+        self.freshness = freshness
+        self._users = LRUCache(max_size)  # user_id -> (display_name, avatar_url, last_updated)
+
+    def _is_fresh(self, last_updated: datetime) -> bool:
+        return datetime.now(timezone.utc) - last_updated < self.freshness
+
+    async def get(self, user_id: int | None) -> tuple[str, str | None]:
+        # Returns (display_name, avatar_url)
+        if user_id is None:
+            return UNKNOWN_AUTHOR
+
+        cached = self._users.get(user_id)
+        if cached and self._is_fresh(cached[2]):
+            return cached[0], cached[1]
+
+        stored = await get_discord_user(user_id)
+        if stored and self._is_fresh(stored['last_updated']):
+            self._users.put(user_id, (stored['display_name'], stored['avatar_url'], stored['last_updated']))
+            return stored['display_name'], stored['avatar_url']
+
+        try:
+            with metrics.timer(metrics.REST_LATENCY, "fetch_user", metrics.REST_ERRORS):
+                user = await self.client.fetch_user(user_id)
+        except discord.NotFound:
+            logging.debug(f"User with id {user_id} not found.")
+            return UNKNOWN_AUTHOR
+        except Exception as e:
+            logging.error(f"An unexpected error occurred: {e}")
+            # A stale copy still beats no name at all
+            if stored:
+                return stored['display_name'], stored['avatar_url']
+            return UNKNOWN_AUTHOR
+
+        avatar_url = user.avatar.url if user.avatar else None
+        await store_discord_user(user_id, user.display_name, avatar_url)
+        self._users.put(user_id, (user.display_name, avatar_url, datetime.now(timezone.utc)))
+        return user.display_name, avatar_url
@@ -0,0 +1,80 @@
+import time
+import asyncio
+import argparse
+import statistics
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import db
+import async_db
+
+BENCH_GUILD_ID = -1       # Guild ID that no real Discord guild can have
+TICK_SECONDS = 0.005      # How often the lag monitor expects to wake up
+
+
+async def monitor_lag(samples: list, stop: asyncio.Event):
+    # Records how late each wakeup is, i.e. how long the loop was blocked
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + TICK_SECONDS
+        await asyncio.sleep(TICK_SECONDS)
+        samples.append(max(0.0, loop.time() - expected))
+
+
+async def answer_sync(question_id: int, user_id: int):
+    # The old call path: the query runs on the event loop thread
+    db.store_answer(question_id, BENCH_GUILD_ID, user_id, f"answer {user_id}")
+
+
+async def answer_async(question_id: int, user_id: int):
+    await async_db.store_answer(question_id, BENCH_GUILD_ID, user_id, f"answer {user_id}")
+
+
+async def run_load(answer, question_id: int, users: int):
+    samples = []
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(monitor_lag(samples, stop))
+    await asyncio.sleep(TICK_SECONDS * 2)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(answer(question_id, user_id) for user_id in range(1, users + 1)))
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await monitor
+    return elapsed, samples
+
+
+def report(label: str, elapsed: float, samples: list):
+    samples = sorted(samples) or [0.0]
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    print(f"{label:<8} total {elapsed * 1000:8.1f} ms | loop lag mean {statistics.mean(samples) * 1000:7.2f} ms "
+          f"p99 {p99 * 1000:7.2f} ms max {samples[-1] * 1000:7.2f} ms | wakeups {len(samples)}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Measures event-loop lag while many /answer submissions hit the database.")
+    parser.add_argument('--users', type=int, default=500, help='Number of concurrent answer submissions per run.')
+    args = parser.parse_args()
+
+    db.init_db()
+    db.store_question(BENCH_GUILD_ID, 0, "QA", "Benchmark question", "benchmark", 1)
+    question = db.pull_random_trivia(BENCH_GUILD_ID)
+
+    try:
+        print(f"\n--- Event loop lag under {args.users} concurrent answers ---")
+        report("sync", *await run_load(answer_sync, question['id'], args.users))
+        report("async", *await run_load(answer_async, question['id'], args.users))
+        print("-----------------------------------------------------\n")
+    finally:
+        with db.get_connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute("DELETE FROM trivia_questions WHERE guild_id = %s", (BENCH_GUILD_ID,))
+                cursor.execute("DELETE FROM trivia_decks WHERE guild_id = %s", (BENCH_GUILD_ID,))
+            connection.commit()
+        async_db.shutdown()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,120 @@
+import time
+import argparse
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import db
+from migrations import run_migrations, LATEST_VERSION
+
+BENCH_SCHEMA = "nak_bench"
+BASELINE_VERSION = 2      # Schema before the hot-query indexes were added
+RUNS = 5                  # Timed executions per query, the best one is reported
+
+# The hot queries from db.py, with parameters pointing into the synthetic data
+HOT_QUERIES = {
+    "get_expired_questions": (
+        "SELECT * FROM trivia_questions WHERE expires_at <= now() AND closed = FALSE", ()
+    ),
+    "get_active_question": ("""
+        SELECT * FROM trivia_questions
+        WHERE guild_id = %s AND asked_at IS NOT NULL
+          AND closed = FALSE AND expires_at > now()
+        ORDER BY asked_at DESC LIMIT 1
+    """, (1,)),
+    "get_answers_for_question": (
+        "SELECT id, user_id, answer FROM user_answers WHERE question_id = %s", (1,)
+    ),
+    "get_leaderboard": ("""
+        SELECT user_id, points FROM leaderboard
+        WHERE guild_id = %s ORDER BY points DESC LIMIT 10
+    """, (1,)),
+}
+
+
+def seed(cursor, guilds: int, questions: int, answers: int, players: int):
+    # Nearly every question has already been asked and closed, as in a long-running guild.
+    # Only the newest two per guild are still open, and of those only the last 48 minutes'
+    # worth have not expired yet
+    cursor.execute("""
+        INSERT INTO trivia_questions (guild_id, user_id, question_type, question, answer, difficulty,
+                                      asked_at, expires_at, closed)
+        SELECT n %% %s + 1, n %% %s + 1, 'QA', 'Question ' || n, 'Answer ' || n, n %% 5 + 1,
+               now() - (n || ' minutes')::interval, now() - (n || ' minutes')::interval + interval '49 minutes',
+               n > %s * 2
+        FROM generate_series(1, %s) AS n
+    """, (guilds, players, guilds, questions))
+    cursor.execute("""
+        INSERT INTO user_answers (question_id, guild_id, user_id, answer, is_correct)
+        SELECT n %% %s + 1, 0, n / %s + 1, 'Answer ' || n, n %% 3 = 0
+        FROM generate_series(0, %s - 1) AS n
+    """, (questions, questions, answers))
+    cursor.execute("""
+        INSERT INTO leaderboard (guild_id, user_id, points)
+        SELECT n %% %s + 1, n, (random() * 5000)::int
+        FROM generate_series(1, %s) AS n
+    """, (guilds, players))
+    cursor.execute("ANALYZE trivia_questions, user_answers, leaderboard")
+
+
+def measure(cursor, label: str):
+    print(f"\n--- {label} ---")
+    for name, (sql, params) in HOT_QUERIES.items():
+        cursor.execute("EXPLAIN (ANALYZE, BUFFERS) " + sql, params)
+        plan = [row[0] for row in cursor.fetchall()]
+
+        timings = []
+        for _ in range(RUNS):
+            start = time.perf_counter()
+            cursor.execute(sql, params)
+            cursor.fetchall()
+            timings.append(time.perf_counter() - start)
+
+        print(f"{name:<26} best {min(timings) * 1000:8.2f} ms | {plan[0].strip()}")
+        for line in plan[1:]:
+            print(f"{'':<28}{line}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seeds a synthetic dataset and compares hot-query plans before and after the index migrations.")
+    parser.add_argument('--guilds', type=int, default=500, help='Number of guilds to spread the data over.')
+    parser.add_argument('--questions', type=int, default=200_000, help='Number of trivia questions.')
+    parser.add_argument('--answers', type=int, default=2_000_000, help='Number of user answers.')
+    parser.add_argument('--players', type=int, default=200_000, help='Number of leaderboard rows.')
+    args = parser.parse_args()
+
+    # Work in a scratch schema so the real tables are never touched
+    with db.get_connection() as connection:
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE")
+                cursor.execute(f"CREATE SCHEMA {BENCH_SCHEMA}")
+                cursor.execute(f"SET search_path TO {BENCH_SCHEMA}")
+            connection.commit()
+
+            run_migrations(connection, target=BASELINE_VERSION)
+
+            print(f"Seeding {args.questions} questions, {args.answers} answers and {args.players} players...")
+            with connection.cursor() as cursor:
+                seed(cursor, args.guilds, args.questions, args.answers, args.players)
+            connection.commit()
+
+            with connection.cursor() as cursor:
+                measure(cursor, f"Before (schema version {BASELINE_VERSION})")
+            connection.rollback()
+
+            run_migrations(connection)
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE trivia_questions, user_answers, leaderboard")
+                measure(cursor, f"After (schema version {LATEST_VERSION})")
+            connection.rollback()
+        finally:
+            connection.rollback()
+            with connection.cursor() as cursor:
+                cursor.execute(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE")
+                cursor.execute("RESET search_path")
+            connection.commit()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import re
+import time
+import argparse
+import statistics
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import db
+
+BENCH_GUILD_ID = -1       # Guild ID that no real Discord guild can have
+
+
+def bench_params(question_id: int) -> dict:
+    # Arguments for each registry statement, pointing at the benchmark question
+    now = datetime.now(timezone.utc)
+    return {
+        'get_active_question': (BENCH_GUILD_ID, now),
+        'store_answer': (question_id, BENCH_GUILD_ID, 1, "Benchmark Answer", "benchmark answer"),
+        'update_leaderboard': (BENCH_GUILD_ID, 1, 10),
+        'get_answers_for_question': (question_id,),
+        'get_leaderboard': (BENCH_GUILD_ID,),
+    }
+
+
+def time_calls(execute, iterations: int) -> list:
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        execute()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compares per-call latency of prepared hot queries with plain cursor.execute.")
+    parser.add_argument('--iterations', type=int, default=2000, help='Calls per statement and mode.')
+    args = parser.parse_args()
+
+    db.init_db()
+    db.store_question(BENCH_GUILD_ID, 0, "QA", "Benchmark question", "benchmark", 1)
+    question = db.pull_random_trivia(BENCH_GUILD_ID)
+
+    try:
+        with db.get_connection() as connection:
+            with connection.cursor() as cursor:
+                print(f"\n--- Per-call latency over {args.iterations} calls (median / p99, ms) ---")
+                for name, params in bench_params(question['id']).items():
+                    # The same statement as plain SQL with %s placeholders, parsed and planned every call
+                    adhoc_sql = re.sub(r"\$\d+", "%s", db.PREPARED_STATEMENTS[name])
+
+                    def run_adhoc():
+                        cursor.execute(adhoc_sql, params)
+
+                    def run_prepared():
+                        db.execute_prepared(cursor, name, params)
+
+                    results = []
+                    for execute in (run_adhoc, run_prepared):
+                        execute()  # Warm up, and prepare the statement outside the timed loop
+                        timings = sorted(time_calls(execute, args.iterations))
+                        results.append((statistics.median(timings) * 1000, timings[int(len(timings) * 0.99)] * 1000))
+
+                    (adhoc_median, adhoc_p99), (prepared_median, prepared_p99) = results
+                    print(f"{name:<26} ad-hoc {adhoc_median:6.3f} / {adhoc_p99:6.3f} | "
+                          f"prepared {prepared_median:6.3f} / {prepared_p99:6.3f} | "
+                          f"{adhoc_median / prepared_median:4.2f}x")
+                print("-----------------------------------------------------------------\n")
+            # Leave no benchmark writes behind
+            connection.rollback()
+    finally:
+        with db.get_connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute("DELETE FROM trivia_questions WHERE guild_id = %s", (BENCH_GUILD_ID,))
+                cursor.execute("DELETE FROM trivia_decks WHERE guild_id = %s", (BENCH_GUILD_ID,))
+            connection.commit()
+
+if __name__ == "__main__":
+    main()
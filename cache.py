@@ -0,0 +1,230 @@
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+# How long to remember that a guild has no active question before asking the DB again
+NO_QUESTION_TTL_SECONDS = 60
+
+
+class ActiveQuestionCache:
+    # Per-guild copy of the question currently open for answers, so /answer doesn't have to
+    # query for it. daily_trivia stores each question it posts, check_for_expired_trivia
+    # discards each one it closes, and an entry lapses on its own once expires_at passes.
+    # A per-guild generation keeps a read that raced one of those writes from caching what it
+    # replaced, e.g. "no question" read just before daily_trivia posted one.
+
+    def __init__(self):
+        self._entries = {}      # guild_id -> (question or None, monotonic deadline for None entries)
+        self._generations = {}  # guild_id -> count of writes and drops
+        self._clears = 0        # count of clear() calls, which retire every guild's reads at once
+
+    def lookup(self, guild_id: int) -> tuple[bool, dict | None]:
+        # Returns (found, question); found is False when the DB has to be asked
+        entry = self._entries.get(guild_id)
+        if entry is None:
+            return False, None
+
+        question, deadline = entry
+        if question is None:
+            if time.monotonic() < deadline:
+                return True, None
+        elif question['expires_at'] > datetime.now(timezone.utc):
+            return True, question
+
+        del self._entries[guild_id]
+        return False, None
+
+    def generation(self, guild_id: int) -> int:
+        # Both counts only grow, so their sum changes whenever either does
+        return self._generations.get(guild_id, 0) + self._clears
+
+    def store(self, guild_id: int, question: dict | None, generation: int | None = None):
+        # Readers pass the generation from before their query; writers that know the current
+        # question pass none and always win
+        if generation is not None:
+            if generation != self.generation(guild_id):
+                return
+        else:
+            self._bump(guild_id)
+        self._entries[guild_id] = (question, time.monotonic() + NO_QUESTION_TTL_SECONDS)
+
+    def discard(self, guild_id: int, question_id: int):
+        # Only drop the entry if it is still the question being closed
+        self._bump(guild_id)
+        entry = self._entries.get(guild_id)
+        if entry and entry[0] and entry[0]['id'] == question_id:
+            del self._entries[guild_id]
+
+    def forget(self, guild_id: int):
+        # Drop whatever is cached for the guild, e.g. when another process posts a question
+        self._bump(guild_id)
+        self._entries.pop(guild_id, None)
+
+    def clear(self):
+        self._clears += 1
+        self._entries.clear()
+
+    def _bump(self, guild_id: int):
+        self._generations[guild_id] = self._generations.get(guild_id, 0) + 1
+
+
+class GuildConfigCache:
+    # Every guild's trivia channel and mention role, loaded once at startup so the tasks don't
+    # have to read guild_config. Written through by /settriviachannel and /settriviarole and
+    # optionally reloaded on a timer; a reload that started before a write is ignored.
+    # owns_guild limits it to the guilds this process posts to and scores, so a config heard
+    # about from another process's shard never makes daily_trivia post there too.
+
+    def __init__(self, owns_guild=None):
+        self.owns_guild = owns_guild or (lambda guild_id: True)
+        self._configs = {}      # guild_id -> {'guild_id', 'channel_id', 'mention_role_id'}
+        self._generation = 0    # Count of writes, to spot reloads that raced one
+        self.loaded = False     # Whether a full load has succeeded yet
+
+    def get(self, guild_id: int) -> dict | None:
+        return self._configs.get(guild_id)
+
+    def all(self) -> list[dict]:
+        return list(self._configs.values())
+
+    def generation(self) -> int:
+        return self._generation
+
+    def load(self, configs, generation: int) -> bool:
+        if generation != self._generation:
+            return False
+        self._configs = {config['guild_id']: dict(config) for config in configs if self.owns_guild(config['guild_id'])}
+        self.loaded = True
+        return True
+
+    def store(self, config):
+        if not self.owns_guild(config['guild_id']):
+            return
+        self._generation += 1
+        self._configs[config['guild_id']] = dict(config)
+
+    def set_channel(self, guild_id: int, channel_id: int):
+        config = self._configs.get(guild_id, {'guild_id': guild_id, 'mention_role_id': None})
+        self.store({**config, 'channel_id': channel_id})
+
+    def set_role(self, guild_id: int, role_id: int | None):
+        # Like set_trivia_role, only guilds with a trivia channel have a config to update
+        config = self._configs.get(guild_id)
+        if config:
+            self.store({**config, 'mention_role_id': role_id})
+
+
+class LRUCache:
+    # Small least-recently-used map; the oldest entry is evicted once max_size is reached
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        if key not in self._entries:
+            return None
+        self._entries.move_to_end(key)
+        return self._entries[key]
+
+    def put(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def discard(self, key):
+        self._entries.pop(key, None)
+
+
+class LeaderboardCache:
+    # Per-guild top players kept in memory so /leaderboard doesn't query the DB. A guild's board
+    # is loaded on first read and then updated in place with each player's new total whenever
+    # points are awarded. Totals only ever grow, so everyone outside the top `size` stays below
+    # its last entry until an award tells us their new total. The rendered embed is reused
+    # until the board next changes.
+
+    def __init__(self, size: int):
+        self.size = size
+        self._boards = {}        # guild_id -> [(user_id, points)] ordered by points desc, user_id
+        self._rendered = {}      # guild_id -> (render key, rendered board)
+        self._generations = {}   # guild_id -> count of awards, to spot loads that raced an award
+
+    def get(self, guild_id: int) -> list[tuple[int, int]] | None:
+        return self._boards.get(guild_id)
+
+    def generation(self, guild_id: int) -> int:
+        return self._generations.get(guild_id, 0)
+
+    def load(self, guild_id: int, entries: list[tuple[int, int]], generation: int):
+        # Ignore a load read from the DB before points were last awarded in this guild
+        if generation == self.generation(guild_id):
+            self._boards[guild_id] = entries[:self.size]
+
+    def apply(self, guild_id: int, totals: dict[int, int]):
+        # totals maps each player who was just awarded points to their new all-time total
+        self._generations[guild_id] = self.generation(guild_id) + 1
+        board = self._boards.get(guild_id)
+        if board is None or not totals:
+            return
+
+        merged = dict(board)
+        merged.update(totals)
+        updated = sorted(merged.items(), key=lambda entry: (-entry[1], entry[0]))[:self.size]
+        if updated != board:
+            self._boards[guild_id] = updated
+            self._rendered.pop(guild_id, None)
+
+    def discard(self, guild_id: int):
+        # Forget a guild's board (and any load in flight) so the next read reloads it
+        self._generations[guild_id] = self.generation(guild_id) + 1
+        self._boards.pop(guild_id, None)
+        self._rendered.pop(guild_id, None)
+
+    def clear(self):
+        for guild_id in set(self._boards) | set(self._generations):
+            self.discard(guild_id)
+
+    def rendered(self, guild_id: int, key):
+        entry = self._rendered.get(guild_id)
+        return entry[1] if entry and entry[0] == key else None
+
+    def store_rendered(self, guild_id: int, key, rendered):
+        self._rendered[guild_id] = (key, rendered)
+
+
+class UserStatsCache:
+    # Recently viewed /stats rows keyed by (guild_id, user_id). Scoring a question drops the
+    # entries of everyone who answered it, and a per-guild generation keeps a read that raced
+    # that scoring run from caching the row it replaced. Entries also carry their guild's
+    # epoch, so every entry for a guild can be retired at once when another process scores.
+
+    def __init__(self, max_size: int):
+        self._stats = LRUCache(max_size)   # (guild_id, user_id) -> (epoch, stats)
+        self._generations = {}             # guild_id -> count of scoring runs
+        self._epochs = {}                  # guild_id -> count of guild-wide discards
+
+    def get(self, guild_id: int, user_id: int) -> dict | None:
+        entry = self._stats.get((guild_id, user_id))
+        return entry[1] if entry and entry[0] == self._epochs.get(guild_id, 0) else None
+
+    def generation(self, guild_id: int) -> int:
+        return self._generations.get(guild_id, 0)
+
+    def store(self, guild_id: int, user_id: int, stats: dict, generation: int):
+        if generation == self.generation(guild_id):
+            self._stats.put((guild_id, user_id), (self._epochs.get(guild_id, 0), stats))
+
+    def invalidate(self, guild_id: int, user_ids):
+        self._generations[guild_id] = self.generation(guild_id) + 1
+        for user_id in user_ids:
+            self._stats.discard((guild_id, user_id))
+
+    def discard_guild(self, guild_id: int):
+        self._generations[guild_id] = self.generation(guild_id) + 1
+        self._epochs[guild_id] = self._epochs.get(guild_id, 0) + 1
+
+    def clear(self):
+        for guild_id in list(self._generations):
+            self._generations[guild_id] += 1
+        self._stats = LRUCache(self._stats.max_size)
@@ -0,0 +1,155 @@
+import time
+import logging
+import threading
+
+import psycopg2
+import psycopg2.extensions
+from psycopg2.pool import PoolError
+
+
+class ConnectionPool:
+    # Thread-safe psycopg2 connection pool. Unlike psycopg2's own pools it keeps up to max_size
+    # idle connections open, makes callers wait (up to timeout seconds) instead of failing when
+    # every connection is busy, pings connections that have sat idle before handing them out,
+    # and replaces connections older than recycle_seconds. stats() reports how it is coping.
+
+    def __init__(self, dsn: str, min_size: int, max_size: int, timeout: float,
+                 recycle_seconds: float, ping_after_idle_seconds: float, **connect_kwargs):
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.recycle_seconds = recycle_seconds
+        self.ping_after_idle_seconds = ping_after_idle_seconds
+        self.connect_kwargs = connect_kwargs
+
+        self._condition = threading.Condition()
+        self._idle = []           # (connection, last_used) with the most recently used last
+        self._created_at = {}     # id(connection) -> monotonic time it was opened
+        self._size = 0            # Open connections, idle or in use
+        self._in_use = 0
+
+        self._checkouts = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._exhausted = 0       # Checkouts that found every connection busy and had to wait
+        self._timeouts = 0
+        self._recycled = 0        # Connections closed for age
+        self._reconnects = 0      # Connections found dead and replaced
+
+        for _ in range(min_size):
+            connection = self._connect()
+            with self._condition:
+                self._size += 1
+                self._idle.append((connection, time.monotonic()))
+
+    def _connect(self):
+        connection = psycopg2.connect(self.dsn, **self.connect_kwargs)
+        self._created_at[id(connection)] = time.monotonic()
+        return connection
+
+    def _discard(self, connection):
+        self._created_at.pop(id(connection), None)
+        if not connection.closed:
+            connection.close()
+
+    def _is_usable(self, connection, last_used: float) -> bool:
+        now = time.monotonic()
+        if connection.closed:
+            self._reconnects += 1
+            return False
+        if now - self._created_at.get(id(connection), now) > self.recycle_seconds:
+            self._recycled += 1
+            return False
+        if now - last_used > self.ping_after_idle_seconds:
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                connection.rollback()
+            except psycopg2.Error:
+                logging.warning("Discarding a pooled database connection that failed its health check.")
+                self._reconnects += 1
+                return False
+        return True
+
+    def getconn(self):
+        start = time.monotonic()
+        with self._condition:
+            if not self._idle and self._size >= self.max_size:
+                self._exhausted += 1
+                deadline = start + self.timeout
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolError(f"Timed out after {self.timeout}s waiting for a database connection")
+                    self._condition.wait(remaining)
+
+            entry = self._idle.pop() if self._idle else None
+            if entry is None:
+                self._size += 1
+            self._in_use += 1
+
+            wait = time.monotonic() - start
+            self._checkouts += 1
+            self._total_wait += wait
+            self._max_wait = max(self._max_wait, wait)
+
+        # Validating or opening a connection does network I/O, so do it outside the lock
+        try:
+            if entry is not None:
+                connection, last_used = entry
+                if self._is_usable(connection, last_used):
+                    return connection
+                self._discard(connection)
+            return self._connect()
+        except Exception:
+            with self._condition:
+                self._size -= 1
+                self._in_use -= 1
+                self._condition.notify()
+            raise
+
+    def putconn(self, connection):
+        if not connection.closed:
+            status = connection.info.transaction_status
+            if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                # Server connection lost
+                self._discard(connection)
+            elif status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    connection.rollback()
+                except psycopg2.Error:
+                    self._discard(connection)
+
+        with self._condition:
+            self._in_use -= 1
+            if connection.closed:
+                self._created_at.pop(id(connection), None)
+                self._size -= 1
+            else:
+                self._idle.append((connection, time.monotonic()))
+            self._condition.notify()
+
+    def closeall(self):
+        with self._condition:
+            for connection, _ in self._idle:
+                self._discard(connection)
+            self._size -= len(self._idle)
+            self._idle.clear()
+
+    def stats(self) -> dict:
+        with self._condition:
+            return {
+                'size': self._size,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'max_size': self.max_size,
+                'checkouts': self._checkouts,
+                'avg_wait_ms': self._total_wait / self._checkouts * 1000 if self._checkouts else 0.0,
+                'max_wait_ms': self._max_wait * 1000,
+                'exhausted': self._exhausted,
+                'timeouts': self._timeouts,
+                'recycled': self._recycled,
+                'reconnects': self._reconnects,
+            }
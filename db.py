@@ -1,20 +1,51 @@
 import os
+import json
+import uuid
 import psycopg2
+import psycopg2.errors
 import psycopg2.extras
-from psycopg2.pool import SimpleConnectionPool
+import psycopg2.extensions
 from contextlib import contextmanager
 from datetime import datetime, timedelta, timezone
 import logging
+import random
 import sys
+import threading
+
+from connection_pool import ConnectionPool
+from migrations import run_migrations
+from logic import normalize_answer, parse_correct_answers
 
 DATABASE_URL = os.getenv('DATABASE_URL')
 
-# Create a global connection pool
-pool = SimpleConnectionPool(minconn=1, maxconn=10, dsn=DATABASE_URL, sslmode='require')
+DATABASE_SSLMODE = os.getenv('DATABASE_SSLMODE', 'require')
+
+# Connection pool sizing and health checks
+POOL_MIN_CONNECTIONS = int(os.getenv('DB_POOL_MIN', '1'))
+POOL_MAX_CONNECTIONS = int(os.getenv('DB_POOL_MAX', '10'))
+POOL_TIMEOUT_SECONDS = float(os.getenv('DB_POOL_TIMEOUT_SECONDS', '30'))                  # Max wait for a free connection
+POOL_RECYCLE_SECONDS = float(os.getenv('DB_POOL_RECYCLE_SECONDS', '1800'))                # Reopen connections older than this
+POOL_PING_AFTER_IDLE_SECONDS = float(os.getenv('DB_POOL_PING_AFTER_IDLE_SECONDS', '60'))  # Check idle connections before reuse
+
+# The global connection pool, created on first use so importing db doesn't need a live database
+pool = None
+_pool_lock = threading.Lock()
 
 EXPIRATION_HOURS = 0
 EXPIRATION_MINUTES = 49
 
+# Cache invalidation bus. Writers publish events on this channel inside their transaction, so
+# they are only delivered if it commits; every bot process listens and evicts what changed
+INVALIDATION_CHANNEL = "nak_invalidation"
+PROCESS_TOKEN = uuid.uuid4().hex  # Tags this process's events so it can skip its own
+
+# Once a guild's deck cursor gets this close to 1, unasked positions are rescaled back to [0, 1)
+DECK_RESCALE_THRESHOLD = 1e-6
+
+# Windowed leaderboards kept in leaderboard_rollups. Windows start on UTC Monday, the 1st of
+# the month, and the 1st of each quarter (a season)
+LEADERBOARD_WINDOWS = ('week', 'month', 'season')
+
 # logger = logging.getLogger("discord")
 logging.basicConfig(
     level=logging.INFO,
@@ -24,81 +55,204 @@ logging.basicConfig(
     ]
 )
 
+class TrackedConnection(psycopg2.extensions.connection):
+    # Connection that remembers which registry statements its server session has prepared
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared_statements = set()
+        self.stale_statements = set()   # Still prepared on the server but no longer usable
+
+# Hot queries, prepared once per pooled connection and then executed by name so the server
+# skips parsing and planning. Parameters are numbered in the order they are passed. Columns
+# are listed rather than SELECT *, so adding a column doesn't change a statement's result type.
+PREPARED_STATEMENTS = {
+    'get_active_question': """
+        SELECT id, guild_id, user_id, question_type, question, answer, difficulty, created_at,
+               asked_at, expires_at, closed, deck_position, answer_normalized
+        FROM trivia_questions
+        WHERE guild_id = $1 AND asked_at IS NOT NULL
+          AND closed = FALSE AND expires_at > $2
+        ORDER BY asked_at DESC LIMIT 1
+    """,
+    'store_answer': """
+        INSERT INTO user_answers (question_id, guild_id, user_id, answer, answer_normalized)
+        VALUES ($1, $2, $3, $4, $5)
+        ON CONFLICT(question_id, user_id) DO UPDATE SET
+            answer = excluded.answer,
+            answer_normalized = excluded.answer_normalized,
+            submitted_at = CURRENT_TIMESTAMP
+    """,
+    'update_leaderboard': """
+        INSERT INTO leaderboard (guild_id, user_id, points) VALUES ($1, $2, $3)
+        ON CONFLICT(user_id, guild_id) DO UPDATE SET points = leaderboard.points + excluded.points
+    """,
+    'get_answers_for_question': """
+        SELECT id, user_id, answer, answer_normalized FROM user_answers WHERE question_id = $1
+    """,
+    'get_leaderboard': """
+        SELECT user_id, points FROM leaderboard
+        WHERE guild_id = $1 ORDER BY points DESC, user_id LIMIT 10
+    """,
+}
+
+def window_start(window: str, at: datetime | None = None):
+    # First day of the leaderboard window containing `at` (default now), in UTC
+    day = (at or datetime.now(timezone.utc)).astimezone(timezone.utc).date()
+    if window == 'week':
+        return day - timedelta(days=day.weekday())
+    if window == 'month':
+        return day.replace(day=1)
+    if window == 'season':
+        return day.replace(month=(day.month - 1) // 3 * 3 + 1, day=1)
+    raise ValueError(f"Unknown leaderboard window: {window}")
+
+def _prepare(cursor, name: str):
+    connection = cursor.connection
+    if name in connection.stale_statements:
+        cursor.execute(f"DEALLOCATE {name}")
+        connection.stale_statements.discard(name)
+    cursor.execute(f"PREPARE {name} AS {PREPARED_STATEMENTS[name]}")
+    connection.prepared_statements.add(name)
+
+def execute_prepared(cursor, name: str, params: tuple):
+    # Prepares the registry statement on first use in this session, then executes it by name
+    connection = cursor.connection
+    if name not in connection.prepared_statements:
+        _prepare(cursor, name)
+    execute = f"EXECUTE {name} ({', '.join(['%s'] * len(params))})"
+    first_statement = connection.info.transaction_status == psycopg2.extensions.TRANSACTION_STATUS_IDLE
+    try:
+        cursor.execute(execute, params)
+    except (psycopg2.errors.InvalidSqlStatementName, psycopg2.errors.FeatureNotSupported) as e:
+        # The session lost the statement, or a migration in another process changed a table it
+        # reads ("cached plan must not change result type"). Prepare it again, and retry now
+        # if nothing else ran in the aborted transaction; otherwise the next call will.
+        logging.warning(f"Re-preparing statement {name}: {e}")
+        connection.prepared_statements.discard(name)
+        if isinstance(e, psycopg2.errors.FeatureNotSupported):
+            connection.stale_statements.add(name)
+        if not first_statement:
+            raise
+        connection.rollback()
+        _prepare(cursor, name)
+        cursor.execute(execute, params)
+
+def _shard_clause(column: str, shard_count: int, shard_ids: list[int] | None) -> tuple[str, tuple]:
+    # Extra WHERE condition limiting a query to guilds on the given gateway shards, matching
+    # sharding.shard_for_guild. No condition when shard_ids is None (every shard)
+    if shard_ids is None:
+        return "", ()
+    return f" AND mod({column} >> 22, %s) = ANY(%s)", (shard_count, list(shard_ids))
+
+def publish_invalidation(cursor, kind: str, guild_id: int, **fields):
+    # Queue a cache invalidation event on the cursor's transaction; sent when it commits
+    event = {'kind': kind, 'guild_id': guild_id, 'origin': PROCESS_TOKEN, **fields}
+    cursor.execute("SELECT pg_notify(%s, %s)", (INVALIDATION_CHANNEL, json.dumps(event)))
+
+class InvalidationListener:
+    # Dedicated autocommit connection LISTENing on the invalidation channel. Readers watch
+    # fileno() for readability (e.g. loop.add_reader) and call poll() to collect the events
+    # other processes published. Events from ignore_origin (this process) are dropped.
+
+    def __init__(self, ignore_origin: str | None = PROCESS_TOKEN):
+        self.ignore_origin = ignore_origin
+        self.connection = None
+        self.fd = None  # Descriptor being watched, kept since fileno() raises once the connection is lost
+
+    def connect(self):
+        self.connection = psycopg2.connect(DATABASE_URL, sslmode=DATABASE_SSLMODE)
+        self.connection.set_session(autocommit=True)
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"LISTEN {INVALIDATION_CHANNEL}")
+
+    def fileno(self) -> int:
+        return self.connection.fileno()
+
+    def poll(self) -> list[dict]:
+        # Raises psycopg2.Error if the connection was lost; reconnect and assume anything changed
+        self.connection.poll()
+        events = []
+        while self.connection.notifies:
+            notify = self.connection.notifies.pop(0)
+            try:
+                event = json.loads(notify.payload)
+            except ValueError:
+                logging.warning(f"Ignoring malformed invalidation event: {notify.payload}")
+                continue
+            if self.ignore_origin is None or event.get('origin') != self.ignore_origin:
+                events.append(event)
+        return events
+
+    def close(self):
+        # Also after the connection was lost (closed == 2), which still holds the socket open
+        if self.connection:
+            self.connection.close()
+
+def get_pool() -> ConnectionPool:
+    global pool
+    if pool is None:
+        with _pool_lock:
+            if pool is None:
+                pool = ConnectionPool(
+                    DATABASE_URL,
+                    min_size=POOL_MIN_CONNECTIONS,
+                    max_size=POOL_MAX_CONNECTIONS,
+                    timeout=POOL_TIMEOUT_SECONDS,
+                    recycle_seconds=POOL_RECYCLE_SECONDS,
+                    ping_after_idle_seconds=POOL_PING_AFTER_IDLE_SECONDS,
+                    sslmode=DATABASE_SSLMODE,
+                    connection_factory=TrackedConnection
+                )
+    return pool
+
+def pool_stats() -> dict:
+    # Checkout wait times, in-use count and exhaustion events, for sizing the pool
+    return get_pool().stats() if pool else {}
+
 @contextmanager
 def get_connection():
     # Get a connection from the pool and return it when done
-    connection = pool.getconn()
+    connection_pool = get_pool()
+    connection = connection_pool.getconn()
     try:
         yield connection
     finally:
-        pool.putconn(connection)
+        # The pool rolls back anything left uncommitted, so a failed transaction is never reused
+        connection_pool.putconn(connection)
 
 def init_db():
+    # Bring the schema up to date by applying any pending migrations
     with get_connection() as connection:
-        with connection.cursor() as cursor:
-            # Trivia questions table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS trivia_questions (
-                    id SERIAL PRIMARY KEY,
-                    guild_id BIGINT NULL,
-                    user_id BIGINT NULL,
-                    question_type TEXT CHECK(question_type IN ('TF', 'QA', 'LQ')) NOT NULL,
-                    question TEXT NOT NULL,
-                    answer TEXT NOT NULL,
-                    difficulty INTEGER CHECK(difficulty BETWEEN 1 AND 5),
-                    created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
-                    asked_at TIMESTAMPTZ,
-                    expires_at TIMESTAMPTZ,
-                    closed BOOLEAN DEFAULT FALSE NOT NULL
-                )
-            """)
-
-            # User answers table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS user_answers (
-                    id SERIAL PRIMARY KEY,
-                    question_id INTEGER NOT NULL,
-                    guild_id BIGINT NOT NULL,
-                    user_id BIGINT NOT NULL,
-                    answer TEXT NOT NULL,
-                    is_correct BOOLEAN DEFAULT FALSE NOT NULL,
-                    submitted_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(question_id, user_id),
-                    FOREIGN KEY (question_id) REFERENCES trivia_questions(id)
-                        ON DELETE CASCADE
-                )
-            """)
+        run_migrations(connection)
+    logging.info("Database initialized successfully.")
 
-            # Leaderboard table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS leaderboard (
-                    user_id BIGINT NOT NULL,
-                    guild_id BIGINT NOT NULL,
-                    points INTEGER DEFAULT 0,
-                    PRIMARY KEY (user_id, guild_id)
-                )
-            """)
+def get_discord_user(user_id: int):
+    try:
+        with get_connection() as connection:
+            with connection.cursor(cursor_factory=psycopg2.extras.DictCursor) as cursor:
+                cursor.execute("SELECT display_name, avatar_url, last_updated FROM discord_users WHERE user_id = %s", (user_id,))
+                user = cursor.fetchone()
+                return dict(user) if user else None
+    except psycopg2.Error as e:
+        logging.error(f"DB error fetching cached user {user_id}:\n{e}", exc_info=True)
+        return None
 
-            # Guild Configuration table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS guild_config (
-                    guild_id BIGINT PRIMARY KEY,
-                    channel_id BIGINT NOT NULL,
-                    mention_role_id BIGINT NULL
-                )
-            """)
-            
-            # Discord Users table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS discord_users (
-                    user_id BIGINT PRIMARY KEY,
-                    display_name TEXT NOT NULL,
-                    last_updated TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
-                );
-            """)
-
-        connection.commit()
-    logging.info("Database initialized successfully.")
+def store_discord_user(user_id: int, display_name: str, avatar_url: str | None):
+    try:
+        with get_connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute("""
+                    INSERT INTO discord_users (user_id, display_name, avatar_url, last_updated)
+                    VALUES (%s, %s, %s, CURRENT_TIMESTAMP)
+                    ON CONFLICT(user_id) DO UPDATE SET
+                        display_name = excluded.display_name,
+                        avatar_url = excluded.avatar_url,
+                        last_updated = excluded.last_updated
+                """, (user_id, display_name, avatar_url))
+            connection.commit()
+    except psycopg2.Error as e:
+        logging.error(f"DB error caching user {user_id}:\n{e}", exc_info=True)
 
 def set_trivia_channel(guild_id: int, channel_id: int):
     try:
@@ -108,9 +262,12 @@ def set_trivia_channel(guild_id: int, channel_id: int):
                     INSERT INTO guild_config (guild_id, channel_id) VALUES (%s, %s)
                     ON CONFLICT(guild_id) DO UPDATE SET channel_id = excluded.channel_id
                 """, (guild_id, channel_id))
+                publish_invalidation(cursor, 'guild_config', guild_id)
             connection.commit()
+            return True
     except psycopg2.Error as e:
         logging.error(f"DB error while setting trivia channel for guild {guild_id}:\n{e}", exc_info=True)
+        return False
 
 
 def set_trivia_role(guild_id: int, role_id: int | None):
@@ -120,22 +277,37 @@ def set_trivia_role(guild_id: int, role_id: int | None):
                 cursor.execute("""
                     UPDATE guild_config SET mention_role_id = %s WHERE guild_id = %s
                 """, (role_id, guild_id))
+                updated = cursor.rowcount > 0
+                if updated:
+                    publish_invalidation(cursor, 'guild_config', guild_id)
                 connection.commit()
-                return cursor.rowcount > 0
+                return updated
     except psycopg2.Error as e:
         logging.error(f"DB error while setting trivia role for guild {guild_id}:\n{e}", exc_info=True)
         return False
 
 
-def get_all_guild_configs():
+def get_all_guild_configs(shard_count: int = 1, shard_ids: list[int] | None = None):
+    shard_clause, shard_params = _shard_clause("guild_id", shard_count, shard_ids)
     try:
         with get_connection() as connection:
             with connection.cursor(cursor_factory=psycopg2.extras.DictCursor) as cursor:
-                cursor.execute("SELECT guild_id, channel_id, mention_role_id FROM guild_config")
+                cursor.execute(f"SELECT guild_id, channel_id, mention_role_id FROM guild_config WHERE TRUE{shard_clause}", shard_params)
                 return cursor.fetchall()
     except psycopg2.Error as e:
         logging.error(f"DB error while fetching all guild configs:\n{e}", exc_info=True)
-        return []
+        return None
+
+
+def get_guild_config(guild_id: int):
+    try:
+        with get_connection() as connection:
+            with connection.cursor(cursor_factory=psycopg2.extras.DictCursor) as cursor:
+                cursor.execute("SELECT guild_id, channel_id, mention_role_id FROM guild_config WHERE guild_id = %s", (guild_id,))
+                return cursor.fetchone()
+    except psycopg2.Error as e:
+        logging.error(f"DB error while fetching config for guild {guild_id}:\n{e}", exc_info=True)
+        return None
 
 
 def get_channel_for_guild(guild_id: int):
@@ -154,23 +326,81 @@ def store_question(guild_id: int, user_id: int, q_type: str, question: str, answ
     try:
         with get_connection() as connection:
             with connection.cursor() as cursor:
+                # The unasked positions are uniform on [cursor, 1), so shuffling the new question
+                # into that same range keeps every unasked question equally likely to be drawn next
                 cursor.execute("""
-                INSERT INTO trivia_questions (guild_id, user_id, question_type, question, answer, difficulty)
-                VALUES (%s, %s, %s, %s, %s, %s)
-                """, (guild_id, user_id, q_type, question, answer, difficulty))
+                INSERT INTO trivia_questions (guild_id, user_id, question_type, question, answer, answer_normalized, difficulty, deck_position)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, (
+                    SELECT deck.position + random() * (1 - deck.position)
+                    FROM (SELECT COALESCE(MAX(position), 0) AS position FROM trivia_decks WHERE guild_id = %s) deck
+                ))
+                RETURNING id
+                """, (guild_id, user_id, q_type, question, answer, parse_correct_answers(answer, q_type), difficulty, guild_id))
+                question_id = cursor.fetchone()[0]
             connection.commit()
+            return question_id
     except psycopg2.Error as e:
         logging.error(f"DB error while inserting {question}\n{e}", exc_info=True)
+        return None
+
+
+def store_questions(guild_id: int, questions: list[tuple]):
+    # Bulk version of store_question for imports. questions are (user_id, question_type,
+    # question, answer, difficulty) and are written in one transaction, each shuffled into the
+    # unasked part of the guild's deck. Returns the number stored, or None on error.
+    try:
+        with get_connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT COALESCE(MAX(position), 0) FROM trivia_decks WHERE guild_id = %s", (guild_id,))
+                position = cursor.fetchone()[0]
+                psycopg2.extras.execute_values(cursor, """
+                    INSERT INTO trivia_questions (guild_id, user_id, question_type, question, answer, answer_normalized, difficulty, deck_position)
+                    VALUES %s
+                """, [
+                    (guild_id, user_id, q_type, question, answer, parse_correct_answers(answer, q_type), difficulty,
+                     position + random.random() * (1 - position))
+                    for user_id, q_type, question, answer, difficulty in questions
+                ], page_size=1000)
+            connection.commit()
+            return len(questions)
+    except psycopg2.Error as e:
+        logging.error(f"DB error while bulk inserting {len(questions)} questions for guild {guild_id}:\n{e}", exc_info=True)
+        return None
+
+def get_question_texts(guild_id: int):
+    # Returns (id, question) for every question in a guild's bank, or None on error
+    try:
+        with get_connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT id, question FROM trivia_questions WHERE guild_id = %s", (guild_id,))
+                return cursor.fetchall()
+    except psycopg2.Error as e:
+        logging.error(f"DB error fetching question texts for guild {guild_id}:\n{e}", exc_info=True)
+        return None
 
+def iter_questions(guild_id: int, batch_size: int = 1000):
+    # Streams a guild's question bank in id order through a server-side cursor, so only one
+    # batch of rows is held in memory at a time. A DB error partway through is raised to the
+    # caller, since whatever it wrote so far is incomplete.
+    with get_connection() as connection:
+        with connection.cursor(name=f"export_{guild_id}", cursor_factory=psycopg2.extras.DictCursor) as cursor:
+            cursor.itersize = batch_size
+            cursor.execute("""
+                SELECT id, user_id, question_type, question, answer, difficulty, asked_at
+                FROM trivia_questions WHERE guild_id = %s ORDER BY id
+            """, (guild_id,))
+            yield from cursor
 
 def pull_random_trivia(guild_id: int):
     try:
         with get_connection() as connection:
             with connection.cursor(cursor_factory=psycopg2.extras.DictCursor) as cursor:
+                # Draw the top card of the guild's shuffled deck (an index lookup, not a sort)
                 cursor.execute("""
                 SELECT * FROM trivia_questions
                 WHERE asked_at IS NULL AND guild_id = %s
-                ORDER BY RANDOM() LIMIT 1
+                ORDER BY deck_position LIMIT 1
+                FOR UPDATE SKIP LOCKED
                 """, (guild_id,))
 
                 question = cursor.fetchone()
@@ -187,10 +417,30 @@ def pull_random_trivia(guild_id: int):
                     WHERE id = %s
                 """, (now, expires_at, question["id"]))
 
+                # Advance the deck cursor past the drawn question
+                cursor_position = question["deck_position"]
+                if cursor_position >= 1 - DECK_RESCALE_THRESHOLD:
+                    # Stretch the remaining positions back over [0, 1) before they run out of float
+                    # precision. A position can round to exactly 1.0, so the span never goes below
+                    # the threshold and the division can't be by zero
+                    span = max(1 - cursor_position, DECK_RESCALE_THRESHOLD)
+                    cursor.execute("""
+                        UPDATE trivia_questions SET deck_position = GREATEST(deck_position - %s, 0) / %s
+                        WHERE guild_id = %s AND asked_at IS NULL
+                    """, (cursor_position, span, guild_id))
+                    cursor_position = 0
+
+                cursor.execute("""
+                    INSERT INTO trivia_decks (guild_id, position) VALUES (%s, %s)
+                    ON CONFLICT(guild_id) DO UPDATE SET position = excluded.position
+                """, (guild_id, cursor_position))
+                publish_invalidation(cursor, 'question_posted', guild_id, question_id=question["id"])
+
                 connection.commit()
 
                 logging.info(f"Trivia question {question['id']} marked as asked (expires at {expires_at}).")
                 question_dict = dict(question)
+                question_dict['asked_at'] = now
                 question_dict['expires_at'] = expires_at
                 return question_dict
     except psycopg2.Error as e:
@@ -202,12 +452,7 @@ def get_active_question(guild_id: int):
         with get_connection() as connection:
             with connection.cursor(cursor_factory=psycopg2.extras.DictCursor) as cursor:
                 now = datetime.now(timezone.utc)
-                cursor.execute("""
-                    SELECT * FROM trivia_questions
-                    WHERE guild_id = %s AND asked_at IS NOT NULL
-                      AND closed = FALSE AND expires_at > %s
-                    ORDER BY asked_at DESC LIMIT 1
-                """, (guild_id, now))
+                execute_prepared(cursor, 'get_active_question', (guild_id, now))
                 question = cursor.fetchone()
                 return dict(question) if question else None
     except psycopg2.Error as e:
@@ -218,17 +463,48 @@ def store_answer(question_id: int, guild_id: int, user_id: int, answer: str):
     try:
         with get_connection() as connection:
             with connection.cursor() as cursor:
-                cursor.execute("""
-                INSERT INTO user_answers (question_id, guild_id, user_id, answer)
-                VALUES (%s, %s, %s, %s)
-                ON CONFLICT(question_id, user_id) DO UPDATE SET
-                    answer = excluded.answer,
-                    submitted_at = CURRENT_TIMESTAMP
-                """, (question_id, guild_id, user_id, answer))
+                execute_prepared(cursor, 'store_answer', (question_id, guild_id, user_id, answer, normalize_answer(answer)))
             connection.commit()
     except psycopg2.Error as e:
         logging.error(f"DB error inserting answer from user {user_id} for question {question_id}\n{e}", exc_info=True)
 
+def store_answers(answers: list[tuple]):
+    # Bulk version of store_answer for buffered (question_id, guild_id, user_id, answer, submitted_at) rows.
+    # Returns False if the write failed and is worth retrying. Rows that can never be stored,
+    # e.g. for a question that has since been deleted, are logged and dropped instead.
+    # An older row can never overwrite a newer answer from the same user
+    query = """
+        INSERT INTO user_answers (question_id, guild_id, user_id, answer, submitted_at, answer_normalized)
+        VALUES %s
+        ON CONFLICT(question_id, user_id) DO UPDATE SET
+            answer = excluded.answer,
+            answer_normalized = excluded.answer_normalized,
+            submitted_at = excluded.submitted_at
+        WHERE user_answers.submitted_at <= excluded.submitted_at
+    """
+    rows = [(*row, normalize_answer(row[3])) for row in answers]
+    try:
+        with get_connection() as connection:
+            with connection.cursor() as cursor:
+                try:
+                    psycopg2.extras.execute_values(cursor, query, rows, page_size=1000)
+                except (psycopg2.IntegrityError, psycopg2.DataError) as e:
+                    # One bad row fails the whole statement, so store the rest one at a time
+                    logging.warning(f"Bulk insert of {len(rows)} buffered answers failed, retrying row by row: {e}")
+                    connection.rollback()
+                    for row in rows:
+                        cursor.execute("SAVEPOINT store_answer")
+                        try:
+                            psycopg2.extras.execute_values(cursor, query, [row])
+                        except (psycopg2.IntegrityError, psycopg2.DataError) as e:
+                            cursor.execute("ROLLBACK TO SAVEPOINT store_answer")
+                            logging.error(f"Dropping buffered answer from user {row[2]} for question {row[0]}: {e}")
+            connection.commit()
+            return True
+    except psycopg2.Error as e:
+        logging.error(f"DB error inserting {len(answers)} buffered answers\n{e}", exc_info=True)
+        return False
+
 def mark_answer_correct(answer_id: int):
     try:
         with get_connection() as connection:
@@ -239,35 +515,51 @@ def mark_answer_correct(answer_id: int):
         logging.error(f"DB error marking answer {answer_id} as correct:\n{e}", exc_info=True)
 
 
-def get_expired_questions():
+def get_expired_questions(shard_count: int = 1, shard_ids: list[int] | None = None):
+    shard_clause, shard_params = _shard_clause("q.guild_id", shard_count, shard_ids)
     try:
         with get_connection() as connection:
             with connection.cursor(cursor_factory=psycopg2.extras.DictCursor) as cursor:
                 now = datetime.now(timezone.utc)
-                cursor.execute("SELECT * FROM trivia_questions WHERE expires_at <= %s AND closed = FALSE", (now,))
+                cursor.execute(f"""
+                    SELECT q.* FROM trivia_questions q
+                    WHERE q.expires_at <= %s AND q.closed = FALSE{shard_clause}
+                """, (now,) + shard_params)
                 return cursor.fetchall()
     except psycopg2.Error as e:
         logging.error(f"DB error while fetching expired questions:\n{e}", exc_info=True)
         return []
 
+def get_open_expirations(shard_count: int = 1, shard_ids: list[int] | None = None):
+    # (id, expires_at) of every asked question that hasn't been scored yet
+    shard_clause, shard_params = _shard_clause("guild_id", shard_count, shard_ids)
+    try:
+        with get_connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(f"""
+                    SELECT id, expires_at FROM trivia_questions
+                    WHERE closed = FALSE AND expires_at IS NOT NULL{shard_clause}
+                """, shard_params)
+                return cursor.fetchall()
+    except psycopg2.Error as e:
+        logging.error(f"DB error while fetching open question expirations:\n{e}", exc_info=True)
+        return []
+
 def get_answers_for_question(question_id: int):
     try:
         with get_connection() as connection:
             with connection.cursor(cursor_factory=psycopg2.extras.DictCursor) as cursor:
-                cursor.execute("SELECT id, user_id, answer FROM user_answers WHERE question_id = %s", (question_id,))
+                execute_prepared(cursor, 'get_answers_for_question', (question_id,))
                 return cursor.fetchall()
     except psycopg2.Error as e:
         logging.error(f"DB error fetching answers for question {question_id}:\n{e}", exc_info=True)
-        return []
+        return None
 
 def update_leaderboard(guild_id: int, user_id: int, points: int):
     try:
         with get_connection() as connection:
             with connection.cursor() as cursor:
-                cursor.execute("""
-                    INSERT INTO leaderboard (guild_id, user_id, points) VALUES (%s, %s, %s)
-                    ON CONFLICT(user_id, guild_id) DO UPDATE SET points = leaderboard.points + excluded.points
-                """, (guild_id, user_id, points))
+                execute_prepared(cursor, 'update_leaderboard', (guild_id, user_id, points))
             connection.commit()
     except psycopg2.Error as e:
         logging.error(f"DB error updating leaderboard for user {user_id}:\n{e}", exc_info=True)
@@ -281,15 +573,157 @@ def close_question(question_id: int):
     except psycopg2.Error as e:
         logging.error(f"DB error closing question {question_id}:\n{e}", exc_info=True)
 
+def finalize_question(question_id: int, guild_id: int, correct_answer_ids: list[int], points_by_user: dict[int, int]):
+    # Close a scored question and write its correct flags, leaderboard points, ledger rows,
+    # windowed rollups and submitters' stats in a single transaction, so a question can never end up closed without
+    # its winners being paid out. Returns each awarded user's new all-time leaderboard total,
+    # or None if nothing was written.
+    try:
+        with get_connection() as connection:
+            with connection.cursor() as cursor:
+                # Taking the row lock first also stops two sweeps from scoring the same question
+                cursor.execute("UPDATE trivia_questions SET closed = TRUE WHERE id = %s AND closed = FALSE", (question_id,))
+                if cursor.rowcount == 0:
+                    connection.rollback()
+                    logging.info(f"Question {question_id} was already closed, skipping.")
+                    return None
+
+                if correct_answer_ids:
+                    cursor.execute("UPDATE user_answers SET is_correct = TRUE WHERE id = ANY(%s)", (correct_answer_ids,))
+
+                totals = {}
+                if points_by_user:
+                    totals = dict(psycopg2.extras.execute_values(cursor, """
+                        INSERT INTO leaderboard (guild_id, user_id, points) VALUES %s
+                        ON CONFLICT(user_id, guild_id) DO UPDATE SET points = leaderboard.points + excluded.points
+                        RETURNING user_id, points
+                    """, [(guild_id, user_id, points) for user_id, points in points_by_user.items()], page_size=1000, fetch=True))
+
+                    # Record the awards and add them to the current week, month and season
+                    awarded_at = datetime.now(timezone.utc)
+                    psycopg2.extras.execute_values(cursor, """
+                        INSERT INTO points_ledger (guild_id, user_id, question_id, points, awarded_at) VALUES %s
+                    """, [(guild_id, user_id, question_id, points, awarded_at) for user_id, points in points_by_user.items()], page_size=1000)
+                    psycopg2.extras.execute_values(cursor, """
+                        INSERT INTO leaderboard_rollups (guild_id, window_type, window_start, user_id, points) VALUES %s
+                        ON CONFLICT(guild_id, window_type, window_start, user_id)
+                        DO UPDATE SET points = leaderboard_rollups.points + excluded.points
+                    """, [
+                        (guild_id, window, window_start(window, awarded_at), user_id, points)
+                        for window in LEADERBOARD_WINDOWS
+                        for user_id, points in points_by_user.items()
+                    ], page_size=1000)
+
+                # Add this question to every submitter's stats, with the points just awarded
+                cursor.execute("""
+                    INSERT INTO user_stats (guild_id, user_id, answered, correct, points, current_streak, difficulty_solved)
+                    SELECT a.guild_id, a.user_id, 1, a.is_correct::INTEGER, COALESCE(p.points, 0),
+                           a.is_correct::INTEGER, CASE WHEN a.is_correct THEN q.difficulty ELSE 0 END
+                    FROM user_answers a
+                    JOIN trivia_questions q ON q.id = a.question_id
+                    LEFT JOIN unnest(%s::BIGINT[], %s::INTEGER[]) AS p(user_id, points) ON p.user_id = a.user_id
+                    WHERE a.question_id = %s
+                    ON CONFLICT (guild_id, user_id) DO UPDATE SET
+                        answered = user_stats.answered + 1,
+                        correct = user_stats.correct + excluded.correct,
+                        points = user_stats.points + excluded.points,
+                        current_streak = CASE WHEN excluded.correct = 1 THEN user_stats.current_streak + 1 ELSE 0 END,
+                        difficulty_solved = user_stats.difficulty_solved + excluded.difficulty_solved
+                """, (list(points_by_user), list(points_by_user.values()), question_id))
+                publish_invalidation(cursor, 'question_scored', guild_id, question_id=question_id)
+            connection.commit()
+            return totals
+    except psycopg2.Error as e:
+        logging.error(f"DB error finalizing question {question_id}:\n{e}", exc_info=True)
+        return None
+
 def get_leaderboard(guild_id: int):
     try:
         with get_connection() as connection:
             with connection.cursor(cursor_factory=psycopg2.extras.DictCursor) as cursor:
-                cursor.execute("""
-                    SELECT user_id, points FROM leaderboard
-                    WHERE guild_id = %s ORDER BY points DESC LIMIT 10
-                """, (guild_id,))
+                execute_prepared(cursor, 'get_leaderboard', (guild_id,))
                 return cursor.fetchall()
     except psycopg2.Error as e:
         logging.error(f"DB error fetching leaderboard for guild {guild_id}:\n{e}", exc_info=True)
-        return []
\ No newline at end of file
+        return None
+
+
+def _leaderboard_source(guild_id: int, window: str | None) -> tuple[str, tuple]:
+    # FROM/WHERE clause and its parameters for the all-time board or the current window's rollup
+    if window is None:
+        return "leaderboard WHERE guild_id = %s", (guild_id,)
+    return ("leaderboard_rollups WHERE guild_id = %s AND window_type = %s AND window_start = %s",
+            (guild_id, window, window_start(window)))
+
+def get_leaderboard_page(guild_id: int, limit: int, offset: int = 0, after: tuple[int, int] | None = None,
+                         before: tuple[int, int] | None = None, window: str | None = None):
+    # One page of the all-time board (window None) or the current week/month/season, in
+    # (points DESC, user_id) order. after/before are the (points, user_id) of the last/first row
+    # of the page currently shown, so stepping through pages seeks straight to them on the
+    # board's points index. Only a direct jump to a page uses offset, which has to walk the
+    # index entries it skips.
+    source, params = _leaderboard_source(guild_id, window)
+    if after is not None:
+        query = f"""
+            SELECT user_id, points FROM {source} AND points <= %s AND (points < %s OR user_id > %s)
+            ORDER BY points DESC, user_id LIMIT %s
+        """
+        params += (after[0], after[0], after[1], limit)
+    elif before is not None:
+        # Walk the index backwards from the first row shown, then put the page back in order
+        query = f"""
+            SELECT user_id, points FROM {source} AND points >= %s AND (points > %s OR user_id < %s)
+            ORDER BY points, user_id DESC LIMIT %s
+        """
+        params += (before[0], before[0], before[1], limit)
+    else:
+        query = f"""
+            SELECT user_id, points FROM {source}
+            ORDER BY points DESC, user_id LIMIT %s OFFSET %s
+        """
+        params += (limit, offset)
+
+    try:
+        with get_connection() as connection:
+            with connection.cursor(cursor_factory=psycopg2.extras.DictCursor) as cursor:
+                cursor.execute(query, params)
+                rows = cursor.fetchall()
+                return rows[::-1] if before is not None else rows
+    except psycopg2.Error as e:
+        logging.error(f"DB error fetching leaderboard page for guild {guild_id}:\n{e}", exc_info=True)
+        return None
+
+def get_rank(guild_id: int, user_id: int, window: str | None = None):
+    # Returns (rank, points) for a player, or None if they have no points on that board. The
+    # rank counts only the players ahead of them, read off the index, so it costs O(rank)
+    # rather than a count over the whole guild.
+    source, params = _leaderboard_source(guild_id, window)
+    try:
+        with get_connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(f"SELECT points FROM {source} AND user_id = %s", params + (user_id,))
+                row = cursor.fetchone()
+                if row is None:
+                    return None
+                points = row[0]
+                cursor.execute(f"""
+                    SELECT COUNT(*) FROM {source} AND points >= %s AND (points > %s OR user_id < %s)
+                """, params + (points, points, user_id))
+                return cursor.fetchone()[0] + 1, points
+    except psycopg2.Error as e:
+        logging.error(f"DB error fetching rank for user {user_id} in guild {guild_id}:\n{e}", exc_info=True)
+        return None
+
+def get_user_stats(guild_id: int, user_id: int):
+    # Returns the player's stats row, or None if they haven't had an answer scored here yet
+    try:
+        with get_connection() as connection:
+            with connection.cursor(cursor_factory=psycopg2.extras.DictCursor) as cursor:
+                cursor.execute("""
+                    SELECT answered, correct, points, current_streak, difficulty_solved
+                    FROM user_stats WHERE guild_id = %s AND user_id = %s
+                """, (guild_id, user_id))
+                return cursor.fetchone()
+    except psycopg2.Error as e:
+        logging.error(f"DB error fetching stats for user {user_id} in guild {guild_id}:\n{e}", exc_info=True)
+        return None
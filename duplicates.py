@@ -0,0 +1,124 @@
+import math
+import heapq
+import asyncio
+import logging
+from collections import defaultdict
+
+from rapidfuzz import fuzz, process
+
+from async_db import get_question_texts
+from cache import LRUCache
+from logic import normalize_answer
+
+DUPLICATE_THRESHOLD = 85        # Minimum similarity for an existing question to be flagged
+DUPLICATE_CANDIDATES = 50       # Best token matches reranked with rapidfuzz
+MAX_SCANNED_POSTINGS = 20_000   # Posting entries read per lookup before common tokens are skipped
+
+
+def tokenize(text: str) -> set[str]:
+    return set(normalize_answer(text).replace(",", " ").split())
+
+
+class QuestionIndex:
+    # Inverted index from token to the questions containing it, for one guild's bank. A lookup
+    # scores questions by the IDF of the tokens they share with the new question, reading the
+    # rarest tokens' postings first, then reranks only the best few with rapidfuzz. Very common
+    # tokens ("what", "is") are skipped once enough rarer postings have been read, so a lookup
+    # costs the same few milliseconds whether the bank has 500 questions or 50k.
+
+    def __init__(self):
+        self._texts = {}                     # question_id -> normalized question
+        self._questions = {}                 # question_id -> question as submitted, for display
+        self._postings = defaultdict(set)    # token -> question_ids
+
+    def __len__(self):
+        return len(self._texts)
+
+    def add(self, question_id: int, question: str):
+        text = normalize_answer(question)
+        self._texts[question_id] = text
+        self._questions[question_id] = question
+        for token in tokenize(text):
+            self._postings[token].add(question_id)
+
+    def find(self, question: str, limit: int = 3) -> list[tuple[int, float]]:
+        # Returns up to limit (question_id, similarity) pairs at or above DUPLICATE_THRESHOLD, best first
+        text = normalize_answer(question)
+        postings = sorted((self._postings[token] for token in tokenize(text) if token in self._postings), key=len)
+        if not postings:
+            return []
+
+        total = len(self._texts)
+        overlap = defaultdict(float)
+        scanned = 0
+        for ids in postings:
+            if scanned and scanned + len(ids) > MAX_SCANNED_POSTINGS:
+                break
+            scanned += len(ids)
+            weight = math.log(1 + total / len(ids))
+            for question_id in ids:
+                overlap[question_id] += weight
+
+        candidates = heapq.nlargest(DUPLICATE_CANDIDATES, overlap, key=overlap.get)
+        matches = process.extract(
+            text,
+            {question_id: self._texts[question_id] for question_id in candidates},
+            scorer=fuzz.token_sort_ratio,
+            score_cutoff=DUPLICATE_THRESHOLD,
+            limit=limit
+        )
+        return [(question_id, score) for _, score, question_id in matches]
+
+    def text(self, question_id: int) -> str:
+        return self._questions[question_id]
+
+
+class DuplicateDetector:
+    # Per-guild QuestionIndexes, each built from trivia_questions the first time its guild
+    # submits a question and kept up to date as submissions are confirmed.
+
+    def __init__(self, max_guilds: int):
+        self._indexes = LRUCache(max_guilds)
+        self._warming = {}  # guild_id -> lock held while that guild's index is being built
+
+    async def _index(self, guild_id: int) -> QuestionIndex | None:
+        index = self._indexes.get(guild_id)
+        if index is not None:
+            return index
+
+        lock = self._warming.setdefault(guild_id, asyncio.Lock())
+        async with lock:
+            index = self._indexes.get(guild_id)
+            if index is None:
+                rows = await get_question_texts(guild_id)
+                if rows is None:
+                    return None
+                index = await asyncio.to_thread(self._build, rows)
+                self._indexes.put(guild_id, index)
+                logging.info(f"Built duplicate index for guild {guild_id} with {len(index)} questions")
+        self._warming.pop(guild_id, None)
+        return index
+
+    @staticmethod
+    def _build(rows) -> QuestionIndex:
+        index = QuestionIndex()
+        for question_id, question in rows:
+            index.add(question_id, question)
+        return index
+
+    async def find(self, guild_id: int, question: str, limit: int = 3) -> list[tuple[str, float]]:
+        # Returns (existing question, similarity) for likely duplicates, best first
+        index = await self._index(guild_id)
+        if index is None:
+            return []
+        return [(index.text(question_id), score) for question_id, score in index.find(question, limit)]
+
+    def add(self, guild_id: int, question_id: int, question: str):
+        # Only guilds whose index is already built need updating; the rest load it when warmed
+        index = self._indexes.get(guild_id)
+        if index is not None:
+            index.add(question_id, question)
+
+    def discard(self, guild_id: int):
+        # Rebuild from the DB on next use, e.g. after a bulk import
+        self._indexes.discard(guild_id)
@@ -0,0 +1,47 @@
+import os
+import sys
+import signal
+import argparse
+import subprocess
+
+import sharding
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs the bot as several processes, each connecting its own range of gateway shards.")
+    parser.add_argument('--shards', type=int, required=True, help='Total number of gateway shards.')
+    parser.add_argument('--processes', type=int, default=1, help='Processes to split the shards across.')
+    args = parser.parse_args()
+
+    if not 1 <= args.processes <= args.shards:
+        parser.error("--processes must be between 1 and --shards")
+
+    children = []
+    for shard_ids in sharding.split_shards(args.shards, args.processes):
+        env = dict(os.environ, SHARD_COUNT=str(args.shards), SHARD_IDS=",".join(map(str, shard_ids)))
+        print(f"Starting shards {shard_ids[0]}-{shard_ids[-1]} of {args.shards}", flush=True)
+        children.append(subprocess.Popen([sys.executable, "main.py"], env=env, cwd=os.path.dirname(os.path.abspath(__file__))))
+
+    def stop(signum, frame):
+        for child in children:
+            child.send_signal(signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    # If any process exits the deployment is incomplete, so take the rest down with it
+    exit_code = 0
+    while children:
+        pid, status = os.wait()
+        exited = [child for child in children if child.pid == pid]
+        if not exited:
+            continue
+        children.remove(exited[0])
+        code = os.waitstatus_to_exitcode(status)
+        exit_code = exit_code or code
+        if children:
+            stop(None, None)
+    sys.exit(exit_code)
+
+if __name__ == "__main__":
+    main()
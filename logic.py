@@ -1,9 +1,21 @@
 from thefuzz import fuzz
+from rapidfuzz import fuzz as rapid_fuzz, process
+import numpy as np
+import asyncio
+import functools
 import math
+import re
 import logging
 import sys
 
+import metrics
+
 DEBUG = False   # Toggles logging
+MATCH_THRESHOLD = 85    # Minimum similarity score for an answer to count as a match
+SCORING_WORKERS = -1    # Threads used by rapidfuzz for similarity matrices (-1 = all cores)
+
+PUNCTUATION = re.compile(r"[^\w\s,]")  # Commas are kept since they separate List Question items
+WHITESPACE = re.compile(r"\s+")
 
 # Configure Logging
 logging.basicConfig(
@@ -14,12 +26,26 @@ logging.basicConfig(
     ]
 )
 
+# Lowercases, strips punctuation and collapses whitespace so equivalent answers compare equal
+def normalize_answer(answer: str) -> str:
+    answer = PUNCTUATION.sub("", answer.lower())
+    return WHITESPACE.sub(" ", answer).strip()
+
+# Parses a stored answer into its normalized comparable form: the list of items for a
+# List Question, a single-item list otherwise
+def parse_correct_answers(answer: str, question_type: str) -> list[str]:
+    answer = normalize_answer(answer)
+    if question_type == "LQ":
+        return [item.strip() for item in answer.split(",")]
+    return [answer]
+
 # Determines correctness given the correct answer, user answer, and question type
+@metrics.timed(metrics.SCORING_LATENCY, "check_correct")
 async def check_correct(correct_answer: str, user_answer: str, question_type: str, difficulty: int):
     
-    # Remove trailing whitespace and newline characters
-    correct_answer = correct_answer.lower().strip()
-    user_answer = user_answer.lower().strip()
+    # Ignore case, punctuation and extra whitespace
+    correct_answer = normalize_answer(correct_answer)
+    user_answer = normalize_answer(user_answer)
 
     is_correct = False
     points_to_award, max_points = 0, difficulty * 10
@@ -30,12 +56,12 @@ async def check_correct(correct_answer: str, user_answer: str, question_type: st
             similarity_score = fuzz.ratio(correct_answer, user_answer)
             if DEBUG:
                 logging.info(f"Similarity score between {correct_answer} and {user_answer} is {similarity_score}")
-            if similarity_score >= 85:
+            if similarity_score >= MATCH_THRESHOLD:
                 is_correct = True
                 points_to_award = max_points
         # True False
         case "TF":
-            if correct_answer[0] == user_answer[0]:
+            if user_answer and correct_answer[0] == user_answer[0]:
                 is_correct = True
                 points_to_award = max_points
         # List Question
@@ -43,46 +69,169 @@ async def check_correct(correct_answer: str, user_answer: str, question_type: st
             # Separate string answers into lists of answers
             correct_answers = [answer.strip() for answer in correct_answer.split(",")]
             user_answers = [answer.strip() for answer in user_answer.split(",")]
-
-            # Create a mutable copy of correct answers to track matches
-            available_correct_answers = list(correct_answers)
-
-            points_per_answer = math.floor(max_points / len(correct_answers))
-            matched_count = 0
-
-            # If the user submits more answers than exist, award zero points.
-            if len(user_answers) > len(correct_answers):
-                return False, 0
-
-            # For each submitted answer, find the best correct match
-            for u_answer in user_answers:
-                best_match_score = 0
-                best_match_answer = None
-
-                for c_answer in available_correct_answers:
-                    score = fuzz.ratio(u_answer, c_answer)
-                    if score > best_match_score:
-                        best_match_score = score
-                        best_match_answer = c_answer
-                
-                # If a sufficiently strong match is found, award points
-                if best_match_score >= 85:
-                    points_to_award += points_per_answer
-                    matched_count += 1
-                    # Remove the matched answer so it can't be used again
-                    if best_match_answer:
-                        available_correct_answers.remove(best_match_answer)
-            
-            # If the user got all answers correct, award full points
-            if matched_count == len(correct_answers) and len(user_answers) == len(correct_answers):
-                is_correct = True
-                points_to_award = max_points # Ensure max points for a perfect score
+            return grade_list(correct_answers, user_answers, difficulty)
 
     return is_correct, points_to_award
-                    
 
-            
-            
 
-    
+# Remembers the result for each normalized answer to one question, so duplicates are scored once
+class ScoreCache:
+
+    def __init__(self):
+        self.results = {}   # normalized answer -> (is_correct, points)
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+# Scores every submission for one question at once; returns (is_correct, points) per user answer.
+# Gives the same results as calling check_correct on each answer, but computes all similarity
+# scores in a single multi-threaded rapidfuzz cdist call, off the event loop. Pass the same
+# cache for repeat calls about the same question; it must never be shared between questions.
+@metrics.timed(metrics.SCORING_LATENCY, "score_submissions")
+async def score_submissions(correct_answer: str, user_answers: list[str], question_type: str, difficulty: int, cache: ScoreCache | None = None):
+    correct_answers = parse_correct_answers(correct_answer, question_type)
+    user_answers = [normalize_answer(answer) for answer in user_answers]
+    return await score_normalized_submissions(correct_answers, user_answers, question_type, difficulty, cache)
+
+# Same as score_submissions, for answers already normalized at write time: correct_answers as
+# returned by parse_correct_answers and user_answers as returned by normalize_answer
+@metrics.timed(metrics.SCORING_LATENCY, "score_normalized_submissions")
+async def score_normalized_submissions(correct_answers: list[str], user_answers: list[str], question_type: str, difficulty: int, cache: ScoreCache | None = None):
+    return await asyncio.to_thread(_score_submissions, correct_answers, user_answers, question_type, difficulty, cache or ScoreCache())
+
+def _similarity_matrix(queries: list[str], choices: list[str]):
+    # thefuzz rounds rapidfuzz's ratio to an int, so round the same way to keep thresholds identical
+    if not queries or not choices:
+        return np.zeros((len(queries), len(choices)))
+    return np.rint(process.cdist(queries, choices, scorer=rapid_fuzz.ratio, workers=SCORING_WORKERS))
+
+def _score_submissions(correct_answers: list[str], user_answers: list[str], question_type: str, difficulty: int, cache: ScoreCache):
+    # Only answers the cache hasn't seen yet need fuzzy matching
+    new_answers = [answer for answer in dict.fromkeys(user_answers) if answer not in cache.results]
+    cache.misses += len(new_answers)
+    cache.hits += len(user_answers) - len(new_answers)
+    cache.results.update(zip(new_answers, _score_distinct(correct_answers, new_answers, question_type, difficulty)))
+
+    return [cache.results[answer] for answer in user_answers]
+
+def _score_distinct(correct_answers: list[str], user_answers: list[str], question_type: str, difficulty: int):
+    max_points = difficulty * 10
+
+    match question_type:
+        # Question Answer
+        case "QA":
+            scores = _similarity_matrix(user_answers, correct_answers)[:, 0]
+            return [(True, max_points) if score >= MATCH_THRESHOLD else (False, 0) for score in scores]
+        # True False
+        case "TF":
+            return [
+                (True, max_points) if answer and answer[0] == correct_answers[0][0] else (False, 0)
+                for answer in user_answers
+            ]
+        # List Question
+        case "LQ":
+            submitted_lists = [[answer.strip() for answer in user_answer.split(",")] for user_answer in user_answers]
+
+            # One matrix row per distinct submitted item, shared by every submission containing it
+            distinct_items = list(dict.fromkeys(item for items in submitted_lists for item in items))
+            row_for_item = {item: row for row, item in enumerate(distinct_items)}
+            scores = _similarity_matrix(distinct_items, correct_answers)
+
+            return [
+                _grade_list_scores(scores[[row_for_item[item] for item in items]].tolist(), len(correct_answers), max_points)
+                for items in submitted_lists
+            ]
+
+    return [(False, 0) for _ in user_answers]
+
+# Memoized so repeated pairs (the same list item across many submissions) are only scored once
+@functools.lru_cache(maxsize=65536)
+def similarity(a: str, b: str) -> int:
+    return fuzz.ratio(a, b)
+
+# Grades a List Question answer; both lists must already be lowercased and stripped
+def grade_list(correct_answers: list[str], user_answers: list[str], difficulty: int):
+    scores = [[similarity(u_answer, c_answer) for c_answer in correct_answers] for u_answer in user_answers]
+    return _grade_list_scores(scores, len(correct_answers), difficulty * 10)
+
+def _grade_list_scores(scores: list[list[float]], answer_count: int, max_points: int):
+    # scores[i][j] is the similarity of the i-th submitted item to the j-th correct answer
+
+    # If the user submits more answers than exist, award zero points.
+    if len(scores) > answer_count:
+        return False, 0
+
+    points_per_answer = math.floor(max_points / answer_count)
+
+    # Pair submitted items with correct answers so the number of matches is as high as possible,
+    # preferring stronger matches on ties. Any extra match outweighs all similarity combined.
+    match_bonus = 100 * answer_count + 1
+    weights = [[match_bonus + score if score >= MATCH_THRESHOLD else 0 for score in row] for row in scores]
+    assignment = _max_weight_assignment(weights)
+    matched_count = sum(
+        1 for row, column in enumerate(assignment)
+        if column is not None and scores[row][column] >= MATCH_THRESHOLD
+    )
+
+    # If the user got all answers correct, award full points
+    if matched_count == answer_count and len(scores) == answer_count:
+        return True, max_points
+    return False, matched_count * points_per_answer
+
+def _max_weight_assignment(weights: list[list[float]]):
+    # Hungarian algorithm (rows <= columns). Returns the column assigned to each row such that
+    # the total weight is maximal; deterministic for a given matrix.
+    row_count = len(weights)
+    column_count = len(weights[0]) if weights else 0
+    row_potential = [0.0] * (row_count + 1)
+    column_potential = [0.0] * (column_count + 1)
+    row_for_column = [0] * (column_count + 1)  # 1-based row matched to each column, 0 = free
+    previous_column = [0] * (column_count + 1)
+
+    for row in range(1, row_count + 1):
+        row_for_column[0] = row
+        column = 0
+        min_slack = [math.inf] * (column_count + 1)
+        visited = [False] * (column_count + 1)
+
+        # Grow an alternating path from this row until it reaches a free column
+        while True:
+            visited[column] = True
+            current_row = row_for_column[column]
+            delta = math.inf
+            next_column = 0
+            for j in range(1, column_count + 1):
+                if visited[j]:
+                    continue
+                slack = -weights[current_row - 1][j - 1] - row_potential[current_row] - column_potential[j]
+                if slack < min_slack[j]:
+                    min_slack[j] = slack
+                    previous_column[j] = column
+                if min_slack[j] < delta:
+                    delta = min_slack[j]
+                    next_column = j
+            for j in range(column_count + 1):
+                if visited[j]:
+                    row_potential[row_for_column[j]] += delta
+                    column_potential[j] -= delta
+                else:
+                    min_slack[j] -= delta
+            column = next_column
+            if row_for_column[column] == 0:
+                break
+
+        # Flip the path so every row on it takes its new column
+        while column:
+            prior = previous_column[column]
+            row_for_column[column] = row_for_column[prior]
+            column = prior
 
+    assignment = [None] * row_count
+    for j in range(1, column_count + 1):
+        if row_for_column[j]:
+            assignment[row_for_column[j] - 1] = j - 1
+    return assignment
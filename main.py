@@ -5,28 +5,66 @@ from dotenv import load_dotenv
 import os
 import sys
 import logging
+import io
 import asyncio
+import tempfile
+import aiohttp
+from time import perf_counter, monotonic
 
 # Load Environment Variables
 load_dotenv()
 
-from views import ConfirmationView
+from views import ConfirmationView, LeaderboardView, leaderboard_embed
 
 # Imports for commands
 from discord.ext import commands
 from discord import app_commands
 from discord.ext import tasks
-from datetime import time, timezone, datetime
-
-# Database Imports
-from db import init_db, store_question, pull_random_trivia, set_trivia_channel, get_all_guild_configs, get_active_question, store_answer, mark_answer_correct
-from db import get_expired_questions, get_answers_for_question, get_channel_for_guild, update_leaderboard, close_question, get_leaderboard, set_trivia_role
-from logic import check_correct
+from datetime import time, timezone, datetime, timedelta
+
+# Database Imports (async wrappers that run queries off the event loop)
+from async_db import init_db, store_question, pull_random_trivia, set_trivia_channel, get_all_guild_configs, get_active_question, store_answer
+from async_db import get_expired_questions, get_answers_for_question, finalize_question, get_leaderboard, set_trivia_role, get_open_expirations
+from async_db import get_leaderboard_page, get_rank, get_user_stats, get_guild_config, get_channel_for_guild
+import async_db
+from db import pool_stats, InvalidationListener
+import psycopg2
+from logic import score_normalized_submissions, ScoreCache, normalize_answer, parse_correct_answers
+from cache import ActiveQuestionCache, LeaderboardCache, UserStatsCache, GuildConfigCache
+from answer_buffer import AnswerBuffer
+from authors import AuthorCache
+from scheduler import ExpiryScheduler
+from duplicates import DuplicateDetector
+import sharding
+import metrics
+import trivia_io
 
 token = os.getenv('DISCORD_TOKEN')
 # testServerID = os.getenv('DEV_SERVER_ID')       # Testing Only
 # testChannelID = os.getenv('DEV_CHANNEL_ID')     # Testing Only
 TRIVIA_INTERVAL = 60                              # Minutes between trivia questions
+LEADERBOARD_SIZE = 10                             # Players shown by /leaderboard
+
+# Opt-in write-behind buffering for /answer submissions
+ANSWER_BUFFER_ENABLED = os.getenv('ANSWER_BUFFER_ENABLED', 'false').lower() == 'true'
+ANSWER_BUFFER_FLUSH_MS = int(os.getenv('ANSWER_BUFFER_FLUSH_MS', '250'))
+ANSWER_BUFFER_MAX_ROWS = int(os.getenv('ANSWER_BUFFER_MAX_ROWS', '200'))
+
+EXPIRY_SAFETY_SWEEP_MINUTES = 60                  # Minutes between fallback sweeps for expired questions
+TRIVIA_FANOUT_CONCURRENCY = int(os.getenv('TRIVIA_FANOUT_CONCURRENCY', '10'))  # Guilds posted to at once
+
+AUTHOR_CACHE_SIZE = 1024                          # Question authors kept in memory
+AUTHOR_FRESHNESS_HOURS = 24                       # Hours before a cached name/avatar is fetched again
+STATS_CACHE_SIZE = 4096                           # /stats rows kept in memory
+DUPLICATE_INDEX_GUILDS = 256                      # Guild question banks indexed for duplicate checks at once
+GUILD_CONFIG_REFRESH_MINUTES = int(os.getenv('GUILD_CONFIG_REFRESH_MINUTES', '0'))  # Periodic guild_config reload, 0 = off
+
+# Evict cached state when other bot processes change it (see db.InvalidationListener)
+INVALIDATION_ENABLED = os.getenv('CACHE_INVALIDATION_ENABLED', 'true').lower() == 'true'
+INVALIDATION_RECONNECT_SECONDS = 5                # Wait between attempts to reopen the listener
+
+IMPORT_MAX_BYTES = 10 * 1024 * 1024               # Largest file /importtrivia accepts
+IMPORT_PROGRESS_SECONDS = 2                       # Min seconds between /importtrivia progress edits
 # guild = discord.Object(id=testServerID)
 
 # Logging setup
@@ -44,20 +82,71 @@ intents = discord.Intents.default()
 intents.message_content = True
 intents.members = True
 
-# Client represents a client connection to Discord
-class Client(commands.Bot):
+class MetricsCommandTree(app_commands.CommandTree):
+    # Times every slash command from dispatch until it completes or fails
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        interaction.extras['metrics_start'] = perf_counter()
+        return True
+
+    async def on_error(self, interaction: discord.Interaction, error: app_commands.AppCommandError):
+        record_command_metrics(interaction, failed=True)
+        await super().on_error(interaction, error)
+
+def record_command_metrics(interaction: discord.Interaction, failed: bool = False):
+    name = interaction.command.qualified_name if interaction.command else "unknown"
+    metrics.record_command(name, interaction.extras.get('metrics_start'), failed)
+
+# Client represents a client connection to Discord. When SHARD_COUNT is set it connects only
+# this process's shards, and the tasks below only touch guilds on those shards
+class Client(commands.AutoShardedBot if sharding.SHARDED else commands.Bot):
 
     async def setup_hook(self):
-        init_db()
+        await init_db()
+
+        if answer_buffer:
+            answer_buffer.start()
+
+        # Rebuild the expiry timers for questions that were still open when the bot last stopped
+        for question_id, expires_at in await get_open_expirations(**sharding.db_filter()):
+            expiry_scheduler.schedule(question_id, expires_at)
+        expiry_scheduler.start()
+
+        if invalidation_listener:
+            await connect_invalidation_listener()
+
+        await load_guild_configs()
+        if GUILD_CONFIG_REFRESH_MINUTES and not refresh_guild_configs.is_running():
+            refresh_guild_configs.start()
+
+        await metrics.start_server()
 
         if not daily_trivia.is_running():
             daily_trivia.start()
         if not check_for_expired_trivia.is_running():
             check_for_expired_trivia.start()
 
+    async def close(self):
+        expiry_scheduler.stop()
+        if invalidation_listener:
+            close_invalidation_listener()
+        if answer_buffer:
+            await answer_buffer.stop()
+        await metrics.stop_server()
+        await super().close()
+        async_db.shutdown()
+
+    async def on_app_command_completion(self, interaction: discord.Interaction, command):
+        if metrics.ENABLED:
+            record_command_metrics(interaction)
+
     async def on_ready(self):
         logging.info(f"Logged on as {self.user}!")
 
+        # Commands are global, so one process syncing them is enough
+        if not sharding.owns_shard(0):
+            return
+
         try:
             synced = await self.tree.sync()
             logging.info(f'Synced {len(synced)} commands globally')
@@ -65,12 +154,109 @@ class Client(commands.Bot):
         except Exception as e:
             logging.error(f'Error syncing commands: {e}')
 
-client = Client(command_prefix="&", intents=intents)
+# Slash commands are only timed when metrics are enabled
+tree_cls = MetricsCommandTree if metrics.ENABLED else app_commands.CommandTree
+client = Client(command_prefix="&", intents=intents, tree_cls=tree_cls, **sharding.client_kwargs())
+
+# Question currently open for answers in each guild
+active_questions = ActiveQuestionCache()
+
+# Trivia channel and mention role of every guild on this process's shards
+guild_config_cache = GuildConfigCache(sharding.owns_guild)
+
+# Top players in each guild, updated as points are awarded
+leaderboards = LeaderboardCache(LEADERBOARD_SIZE)
+user_stats = UserStatsCache(STATS_CACHE_SIZE)
+duplicates = DuplicateDetector(DUPLICATE_INDEX_GUILDS)
+
+# Display names and avatars of question authors
+authors = AuthorCache(client, AUTHOR_CACHE_SIZE, timedelta(hours=AUTHOR_FRESHNESS_HOURS))
+
+# Posts results as soon as each question expires
+async def on_question_expiry():
+    await client.wait_until_ready()
+    await process_expired_questions()
+
+expiry_scheduler = ExpiryScheduler(on_question_expiry)
+expiry_lock = asyncio.Lock()
+
+# Buffered /answer writes, when enabled
+answer_buffer = AnswerBuffer(ANSWER_BUFFER_FLUSH_MS, ANSWER_BUFFER_MAX_ROWS) if ANSWER_BUFFER_ENABLED else None
+
+# Events published by other bot processes, when enabled
+invalidation_listener = InvalidationListener() if INVALIDATION_ENABLED else None
+
+# The loop only keeps weak references to tasks, so fire-and-forget ones are held here until done
+background_tasks = set()
+
+def start_background_task(coro):
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+def apply_invalidation(event: dict):
+    # Every process hears every event, but only caches its own shards' guilds
+    guild_id = event['guild_id']
+    if not sharding.owns_guild(guild_id):
+        return
+    match event['kind']:
+        case 'guild_config':
+            start_background_task(reload_guild_config(guild_id))
+        case 'question_posted':
+            active_questions.forget(guild_id)
+        case 'question_scored':
+            active_questions.discard(guild_id, event['question_id'])
+            leaderboards.discard(guild_id)
+            user_stats.discard_guild(guild_id)
+
+def on_invalidation_readable():
+    try:
+        events = invalidation_listener.poll()
+    except psycopg2.Error as e:
+        logging.error(f"Lost the cache invalidation connection, reconnecting: {e}")
+        close_invalidation_listener()
+        start_background_task(connect_invalidation_listener(reconnect=True))
+        return
+
+    for event in events:
+        apply_invalidation(event)
+
+async def connect_invalidation_listener(reconnect: bool = False):
+    while True:
+        try:
+            await asyncio.to_thread(invalidation_listener.connect)
+            break
+        except psycopg2.Error as e:
+            logging.error(f"Could not open the cache invalidation connection: {e}")
+            await asyncio.sleep(INVALIDATION_RECONNECT_SECONDS)
+
+    if reconnect:
+        # Events sent while disconnected are lost, so anything cached may be stale
+        active_questions.clear()
+        leaderboards.clear()
+        user_stats.clear()
+        start_background_task(load_guild_configs())
+    invalidation_listener.fd = invalidation_listener.fileno()
+    asyncio.get_running_loop().add_reader(invalidation_listener.fd, on_invalidation_readable)
+
+def close_invalidation_listener():
+    # Stop watching by the saved descriptor; fileno() raises once the connection is lost
+    if invalidation_listener.fd is not None:
+        asyncio.get_running_loop().remove_reader(invalidation_listener.fd)
+        invalidation_listener.fd = None
+    invalidation_listener.close()
 
 # +-+-+-+-+-+-+-+-+-+-+-+-+-+ 
 #  U S E R   C O M M A N D S  
 # +-+-+-+-+-+-+-+-+-+-+-+-+-+ 
 
+async def flag_duplicates(embed: discord.Embed, guild_id: int, question: str):
+    # Warn the submitter about existing questions that look like the same one
+    matches = await duplicates.find(guild_id, question)
+    if matches:
+        similar = "\n".join(f"- {existing} ({score:.0f}% similar)" for existing, score in matches)
+        embed.add_field(name="⚠️ Possible Duplicates", value=similar[:1024], inline=False)
+
 # Add True or False
 @client.tree.command(name="addtf", description="Add a True or False trivia question to the database")
 @app_commands.describe(
@@ -78,6 +264,7 @@ client = Client(command_prefix="&", intents=intents)
     answer="Whether or not the trivia statement is true or false",
 )
 async def addTF(interaction: discord.Interaction, statement: str, answer: bool):
+    await interaction.response.defer(ephemeral=True)
 
     # Package the data for the view
     submission_data = {
@@ -90,12 +277,12 @@ async def addTF(interaction: discord.Interaction, statement: str, answer: bool):
     }
 
     embed = Embed(title="Please Confirm Submission", description=f"**Statement:** {statement}\n**Answer:** {answer}")
-    view = ConfirmationView(submission_data=submission_data)
+    await flag_duplicates(embed, interaction.guild_id, statement)
+    view = ConfirmationView(submission_data=submission_data, duplicates=duplicates)
 
-    await interaction.response.send_message(
+    await interaction.edit_original_response(
         # f"**Please Confirm:** \n**Question:** {question}\n**Answer:** {answer}",
         embed=embed,
-        ephemeral=True,
         view=view
     )
 
@@ -116,6 +303,7 @@ async def addTF(interaction: discord.Interaction, statement: str, answer: bool):
     difficulty="Difficulty level (1-5) with 5 being the hardest"
 )
 async def addQA(interaction: discord.Interaction, question: str, answer: str, difficulty: app_commands.Choice[int]):
+    await interaction.response.defer(ephemeral=True)
 
     # Package the data for confirmation
     submission_data = {
@@ -128,12 +316,12 @@ async def addQA(interaction: discord.Interaction, question: str, answer: str, di
     }
 
     embed = Embed(title="Please Confirm Submission", description=f"**Question:** {question}\n**Answer:** {answer}\n**Difficulty:** {difficulty.value}/5")
-    view = ConfirmationView(submission_data=submission_data)
+    await flag_duplicates(embed, interaction.guild_id, question)
+    view = ConfirmationView(submission_data=submission_data, duplicates=duplicates)
 
-    await interaction.response.send_message(
+    await interaction.edit_original_response(
         # f"**Please Confirm:** \n**Question:** {question}\n**Answer:** {answer}\n**Difficulty: **{difficulty.value}/5",
         embed=embed,
-        ephemeral=True,
         view=view
     )
 
@@ -154,6 +342,7 @@ async def addQA(interaction: discord.Interaction, question: str, answer: str, di
     difficulty="Difficulty based on how many answers there are and how obscure they are"
 )
 async def addLQ(interaction: discord.Interaction, question: str, answers: str, difficulty: app_commands.Choice[int]):
+    await interaction.response.defer(ephemeral=True)
 
     # Package the data for confirmation
     submission_data = {
@@ -173,11 +362,11 @@ async def addLQ(interaction: discord.Interaction, question: str, answers: str, d
         title="Please Confirm Submission", 
         description=f"**Question:** {question}\n\n**Answers:**\n{formatted_answers}\n\n**Difficulty:** {difficulty.value}/5"
     )
-    view = ConfirmationView(submission_data=submission_data)
+    await flag_duplicates(embed, interaction.guild_id, question)
+    view = ConfirmationView(submission_data=submission_data, duplicates=duplicates)
 
-    await interaction.response.send_message(
+    await interaction.edit_original_response(
         embed=embed,
-        ephemeral=True,
         view=view
     )
 
@@ -189,7 +378,10 @@ async def set_trivia_channel_command(interaction: discord.Interaction):
     guild_id = interaction.guild_id
     channel_id = interaction.channel_id
     
-    set_trivia_channel(guild_id, channel_id)
+    if not await set_trivia_channel(guild_id, channel_id):
+        await interaction.edit_original_response(content="Error: Could not set the trivia channel, please try again.")
+        return
+    guild_config_cache.set_channel(guild_id, channel_id)
 
     await interaction.edit_original_response(
         content=f"Trivia channel has been set to this channel (`{interaction.channel.name}`)."
@@ -211,9 +403,10 @@ async def set_trivia_role_command(interaction: discord.Interaction, role: discor
     guild_id = interaction.guild_id
     role_id = role.id if role else None
 
-    success = set_trivia_role(guild_id, role_id)
+    success = await set_trivia_role(guild_id, role_id)
     
     if success:
+        guild_config_cache.set_role(guild_id, role_id)
         if role:
             await interaction.edit_original_response(
                 content=f"The trivia mention role has been set to `{role.name}`."
@@ -236,6 +429,117 @@ async def on_set_role_error(interaction: discord.Interaction, error: app_command
     else:
         raise error
 
+class AttachmentReader(io.RawIOBase):
+    # Blocking file object over a downloading attachment, so the import can parse it from a
+    # worker thread as it arrives instead of holding the whole file. Each read waits on the
+    # event loop for the next chunk of the response.
+
+    def __init__(self, response: aiohttp.ClientResponse, loop: asyncio.AbstractEventLoop):
+        self._response = response
+        self._loop = loop
+        self._chunk = b""
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if not self._chunk:
+            try:
+                self._chunk = asyncio.run_coroutine_threadsafe(self._response.content.readany(), self._loop).result()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                raise OSError(f"download failed ({e})") from e
+        size = min(len(buffer), len(self._chunk))
+        buffer[:size] = self._chunk[:size]
+        self._chunk = self._chunk[size:]
+        return size
+
+@client.tree.command(name="importtrivia", description="Adds every question in a CSV or JSONL file to this server.")
+@app_commands.describe(file="CSV or JSONL with question_type, question, answer, difficulty and optionally user_id.")
+@app_commands.checks.has_permissions(administrator=True)
+async def import_trivia_command(interaction: discord.Interaction, file: discord.Attachment):
+    await interaction.response.defer(ephemeral=True)
+
+    file_format = trivia_io.detect_format(file.filename)
+    if file_format is None:
+        await interaction.edit_original_response(content="Error: The file must be a `.csv` or `.jsonl` file.")
+        return
+    if file.size > IMPORT_MAX_BYTES:
+        await interaction.edit_original_response(content=f"Error: The file must be smaller than {IMPORT_MAX_BYTES // (1024 * 1024)} MB.")
+        return
+
+    loop = asyncio.get_running_loop()
+    last_progress = monotonic()
+
+    def progress(report):
+        # Called from the DB thread after each batch
+        nonlocal last_progress
+        if monotonic() - last_progress >= IMPORT_PROGRESS_SECONDS:
+            last_progress = monotonic()
+            asyncio.run_coroutine_threadsafe(interaction.edit_original_response(
+                content=f"Importing... {report['imported']} imported, {report['rejected']} rejected so far."
+            ), loop)
+
+    # Rows are parsed and written batch by batch off the event loop while the file downloads
+    try:
+        async with aiohttp.ClientSession() as session, session.get(file.url, raise_for_status=True) as response:
+            lines = io.TextIOWrapper(io.BufferedReader(AttachmentReader(response, loop)), encoding='utf-8-sig', newline='')
+            report = await loop.run_in_executor(
+                async_db.executor, trivia_io.import_questions, interaction.guild_id, lines, file_format, interaction.user.id, progress
+            )
+    except aiohttp.ClientError as e:
+        logging.error(f"Failed to download trivia import for guild {interaction.guild_id}: {e}")
+        await interaction.edit_original_response(content="Error: Couldn't download the file, please try again.")
+        return
+    duplicates.discard(interaction.guild_id)
+    logging.info(f"Imported {report['imported']} questions into guild {interaction.guild_id} "
+                 f"({report['rejected']} rejected, {report['failed']} failed)")
+    await interaction.edit_original_response(content=trivia_io.format_report(report)[:2000])
+
+@client.tree.command(name="exporttrivia", description="Downloads every question on this server as a CSV or JSONL file.")
+@app_commands.choices(file_format=[app_commands.Choice(name=name, value=name) for name in trivia_io.FORMATS])
+@app_commands.checks.has_permissions(administrator=True)
+async def export_trivia_command(interaction: discord.Interaction, file_format: app_commands.Choice[str] | None = None):
+    await interaction.response.defer(ephemeral=True)
+    file_format = file_format.value if file_format else 'csv'
+
+    # Rows stream from a server-side cursor into a temp file that only spills to disk once large
+    out = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    text = io.TextIOWrapper(out, encoding='utf-8', newline='')
+    count = await asyncio.get_running_loop().run_in_executor(
+        async_db.executor, trivia_io.export_questions, interaction.guild_id, text, file_format
+    )
+    text.flush()
+    text.detach()
+    if count is None:
+        out.close()
+        await interaction.edit_original_response(content="Error: The export failed partway through, please try again.")
+        return
+
+    # Bots can't upload past the guild's attachment limit, so point big banks at the CLI instead
+    size = out.seek(0, io.SEEK_END)
+    if size > interaction.guild.filesize_limit:
+        out.close()
+        await interaction.edit_original_response(
+            content=f"Error: The export is {size / (1024 * 1024):.1f} MB, over this server's "
+                    f"{interaction.guild.filesize_limit // (1024 * 1024)} MB upload limit. "
+                    f"Ask the bot's host to run `trivia_io.py export {interaction.guild_id}` instead."
+        )
+        return
+    out.seek(0)
+
+    await interaction.edit_original_response(
+        content=f"Exported {count} questions.",
+        attachments=[discord.File(out, filename=f"trivia-{interaction.guild_id}.{file_format}")]
+    )
+
+@import_trivia_command.error
+@export_trivia_command.error
+async def on_trivia_io_error(interaction: discord.Interaction, error: app_commands.AppCommandError):
+    if isinstance(error, app_commands.MissingPermissions):
+        await interaction.edit_original_response(content="Error: You must be an administrator to use this command.")
+    else:
+        raise error
+
 @client.tree.command(name="answer", description="Submit an answer for the most recent trivia question asked.")
 @app_commands.describe(
     answer="QA Questions: Your answer to the most recent question. \n TF Questions: \"True\" or \"False\". "
@@ -246,7 +550,11 @@ async def submit_answer(interaction: discord.Interaction, answer: str):
     guild_id = interaction.guild_id
     user_id = interaction.user.id
 
-    active_question = get_active_question(guild_id=guild_id)
+    found, active_question = active_questions.lookup(guild_id)
+    if not found:
+        generation = active_questions.generation(guild_id)
+        active_question = await get_active_question(guild_id=guild_id)
+        active_questions.store(guild_id, active_question, generation)
     
     if not active_question:
         await interaction.edit_original_response(
@@ -262,39 +570,109 @@ async def submit_answer(interaction: discord.Interaction, answer: str):
         return
 
     question_id = active_question['id']
-    store_answer(question_id, guild_id, user_id, answer.strip())
-    logging.info(f"Stored Answer: {answer.strip()} From User: {user_id}\nFor Question: {active_question['question']} From User: {active_question['user_id']}")
+    if answer_buffer:
+        answer_buffer.submit(question_id, guild_id, user_id, answer.strip())
+    else:
+        await store_answer(question_id, guild_id, user_id, answer.strip())
+    # Runs on every submission, so only format the message when debug logging is on
+    logging.debug("Stored answer from user %s for question %s", user_id, question_id)
     await interaction.edit_original_response(
         content="Your answer has been recorded! You can update it by using the /answer command again."
     )
 
-@client.tree.command(name="leaderboard", description="Displays the top 10 trivia players for this server.")
-async def leaderboard(interaction: discord.Interaction):
+WINDOW_CHOICES = [
+    app_commands.Choice(name="This week", value="week"),
+    app_commands.Choice(name="This month", value="month"),
+    app_commands.Choice(name="This season", value="season"),
+]
+
+@client.tree.command(name="leaderboard", description="Displays the trivia leaderboard for this server, 10 players per page.")
+@app_commands.describe(page="Page of the leaderboard to start on (default 1).", window="Only count points from this period (default all time).")
+@app_commands.choices(window=WINDOW_CHOICES)
+async def leaderboard(interaction: discord.Interaction, page: app_commands.Range[int, 1] = 1,
+                      window: app_commands.Choice[str] | None = None):
     await interaction.response.defer()
 
-    logging.info("Pulling Leaderboard")
     guild_id = interaction.guild_id
-    board = get_leaderboard(guild_id=guild_id)
-    
+    window = window.value if window else None
+    cached = page == 1 and window is None
+
+    if cached:
+        board = leaderboards.get(guild_id)
+        if board is None:
+            logging.info("Pulling Leaderboard")
+            generation = leaderboards.generation(guild_id)
+            rows = await get_leaderboard(guild_id=guild_id)
+            if rows is not None:
+                board = [(row['user_id'], row['points']) for row in rows]
+                leaderboards.load(guild_id, board, generation)
+    else:
+        # Windowed boards and deeper pages are read straight from the DB, later pages are reached with the buttons
+        rows = await get_leaderboard_page(guild_id, LEADERBOARD_SIZE, offset=(page - 1) * LEADERBOARD_SIZE, window=window)
+        board = [(row['user_id'], row['points']) for row in rows] if rows is not None else None
+
     if not board:
-        await interaction.edit_original_response(content="The leaderboard is currently empty.")
+        content = "The leaderboard is currently empty." if page == 1 else f"The leaderboard doesn't have a page {page}."
+        await interaction.edit_original_response(content=content)
         return
-        
-    rankings = []
-    
-    for i, entry in enumerate(board):
-        user_id = entry['user_id']
-        points = entry['points']
-        rank_icon = f"**{i + 1}.**"
-        
-        rankings.append(f"{rank_icon} <@{user_id}> `{points}` points")
-        
-    embed = discord.Embed(
-        title=f"Top 10 Nak-Knowers in {interaction.guild.name}",
-        description="\n".join(rankings),
-        color=discord.Color.gold()
-    )
-    
+
+    # Reuse the all-time first page's embed until the board (or the server name) changes
+    embed = leaderboards.rendered(guild_id, interaction.guild.name) if cached else None
+    if embed is None:
+        embed = leaderboard_embed(interaction.guild.name, board, page, LEADERBOARD_SIZE, window)
+        if cached:
+            leaderboards.store_rendered(guild_id, interaction.guild.name, embed)
+
+    view = LeaderboardView(guild_id, interaction.guild.name, board, page, LEADERBOARD_SIZE, window)
+    view.interaction = interaction
+    await interaction.edit_original_response(embed=embed, view=view)
+
+@client.tree.command(name="rank", description="Shows a player's position on this server's leaderboard.")
+@app_commands.describe(user="Player to look up (defaults to you).", window="Only count points from this period (default all time).")
+@app_commands.choices(window=WINDOW_CHOICES)
+async def rank(interaction: discord.Interaction, user: discord.Member | None = None,
+               window: app_commands.Choice[str] | None = None):
+    await interaction.response.defer(ephemeral=True)
+
+    user = user or interaction.user
+    period = f" {window.name.lower()}" if window else ""
+    result = await get_rank(interaction.guild_id, user.id, window.value if window else None)
+    if result is None:
+        await interaction.edit_original_response(content=f"{user.mention} hasn't scored any points on this server{period} yet.")
+        return
+
+    position, points = result
+    await interaction.edit_original_response(content=f"{user.mention} is ranked **#{position}**{period} with `{points}` points.")
+
+@client.tree.command(name="stats", description="Shows a player's trivia stats for this server.")
+@app_commands.describe(user="Player to look up (defaults to you).")
+async def stats(interaction: discord.Interaction, user: discord.Member | None = None):
+    await interaction.response.defer(ephemeral=True)
+
+    user = user or interaction.user
+    guild_id = interaction.guild_id
+    row = user_stats.get(guild_id, user.id)
+    if row is None:
+        generation = user_stats.generation(guild_id)
+        row = await get_user_stats(guild_id, user.id)
+        if row is not None:
+            row = dict(row)
+            user_stats.store(guild_id, user.id, row, generation)
+
+    if not row:
+        await interaction.edit_original_response(content=f"{user.mention} hasn't had an answer scored on this server yet.")
+        return
+
+    accuracy = row['correct'] / row['answered'] if row['answered'] else 0
+    average_difficulty = f"{row['difficulty_solved'] / row['correct']:.1f}" if row['correct'] else "-"
+
+    embed = discord.Embed(title=f"Trivia stats for {user.display_name}", color=discord.Color.gold())
+    embed.set_thumbnail(url=user.display_avatar.url)
+    embed.add_field(name="Answered", value=f"{row['answered']}")
+    embed.add_field(name="Accuracy", value=f"{accuracy:.0%} ({row['correct']} correct)")
+    embed.add_field(name="Points", value=f"{row['points']}")
+    embed.add_field(name="Current Streak", value=f"{row['current_streak']}")
+    embed.add_field(name="Avg. Difficulty Solved", value=average_difficulty)
     await interaction.edit_original_response(embed=embed)
 
 # +-+-+-+-+-+-+-+-+-+
@@ -311,77 +689,112 @@ async def daily_trivia():
         logging.info("Skipping trivia task during quiet hours (2:00-5:00 UTC).")
         return
 
-    # Get all guilds that have a trivia channel configured
-    guild_configs = get_all_guild_configs()
-
-    for config in guild_configs:
-        guild_id = config['guild_id']
-        channel_id = config['channel_id']
-        mention_role_id = config['mention_role_id']
+    # Get all guilds on this process's shards that have a trivia channel configured
+    if not guild_config_cache.loaded:
+        await load_guild_configs()
+    guild_configs = guild_config_cache.all()
+
+    # Post to every guild concurrently, a bounded number at a time. discord.py queues requests
+    # per rate-limit bucket, so this only overlaps guilds' DB and HTTP waits.
+    tick_start = perf_counter()
+    semaphore = asyncio.Semaphore(TRIVIA_FANOUT_CONCURRENCY)
+
+    async def post_with_limit(config):
+        async with semaphore:
+            guild_start = perf_counter()
+            try:
+                await post_trivia_to_guild(config)
+            except Exception as e:
+                # One guild's failure must not stop the others
+                logging.error(f"Failed to post trivia to guild {config['guild_id']}: {e}", exc_info=True)
+            finally:
+                now = perf_counter()
+                logging.info(f"Trivia for guild {config['guild_id']} done {(now - tick_start) * 1000:.0f} ms into the tick "
+                             f"(took {(now - guild_start) * 1000:.0f} ms)")
+
+    await asyncio.gather(*(post_with_limit(config) for config in guild_configs))
+    logging.info(f"Trivia tick for {len(guild_configs)} guilds took {perf_counter() - tick_start:.2f} s")
+    logging.info(f"DB pool: {pool_stats()}")
+
+async def post_trivia_to_guild(config):
+    guild_id = config['guild_id']
+    channel_id = config['channel_id']
+    mention_role_id = config['mention_role_id']
+
+    # Pull random trivia question from database
+    question = await pull_random_trivia(guild_id=guild_id)
+
+    # If no question is found for this guild, there is nothing to post
+    if not question:
+        logging.info(f"No questions available for guild {guild_id}. Skipping.")
+        return
 
-        # Pull random trivia question from database
-        question = pull_random_trivia(guild_id=guild_id)
+    active_questions.store(guild_id, question)
+    expiry_scheduler.schedule(question['id'], question['expires_at'])
 
-        # If no question is found for this guild, skip to the next one
-        if not question:
-            logging.info(f"No questions available for guild {guild_id}. Skipping.")
-            continue
+    # Get username from user_id of the user who submitted the question
+    authorName, authorIcon = await authors.get(question["user_id"])
 
-        # Get username from user_id of the user who submitted the question
-        authorName = "Unknown Author"
-        authorIcon = None
-        try:
-            user = await client.fetch_user(question["user_id"])
-            authorName = user.display_name
-            if user.avatar:
-                authorIcon = user.avatar.url
-        except discord.NotFound:
-            logging.debug(f"User with id {question["user_id"]} not found.")
-        except Exception as e:
-            logging.error(f"An unexpected error occurred: {e}")
-
-        # Build Embed for announcing question
-        mention_string = ""
-        if mention_role_id:
-            mention_string = f"<@&{mention_role_id}>"
-        trivia_heading = f"### New Trivia Question! {mention_string}"
-        title_ender = "?" if (question["question_type"]=="QA" and not question["question"].endswith("?")) else ""
-        stars = "⭐ " * question["difficulty"] + "➖ " * (5 - question["difficulty"])
-        embed = discord.Embed(
-            title=f"{question["question"]}" + title_ender,
-            color=discord.Color.blue()
-        )
-        embed.set_author(name=f"{authorName}", icon_url=authorIcon)
-        embed.add_field(name="Difficulty", value=f"{stars}", inline=False)
-        embed.add_field(name="Question Type", value=f"{question["question_type"]}", inline=False)
-        expire_ts = int(question['expires_at'].replace(tzinfo=timezone.utc).timestamp())
-        embed.add_field(name="Expires", value=f"<t:{expire_ts}:R>")
-        embed.set_footer(text="Use /answer to submit your answer!")
-
-        # Send message to the configured channel for the guild
-        channel = client.get_channel(channel_id)
-        if channel:
+    # Build Embed for announcing question
+    mention_string = ""
+    if mention_role_id:
+        mention_string = f"<@&{mention_role_id}>"
+    trivia_heading = f"### New Trivia Question! {mention_string}"
+    title_ender = "?" if (question["question_type"]=="QA" and not question["question"].endswith("?")) else ""
+    stars = "⭐ " * question["difficulty"] + "➖ " * (5 - question["difficulty"])
+    embed = discord.Embed(
+        title=f"{question["question"]}" + title_ender,
+        color=discord.Color.blue()
+    )
+    embed.set_author(name=f"{authorName}", icon_url=authorIcon)
+    embed.add_field(name="Difficulty", value=f"{stars}", inline=False)
+    embed.add_field(name="Question Type", value=f"{question["question_type"]}", inline=False)
+    expire_ts = int(question['expires_at'].replace(tzinfo=timezone.utc).timestamp())
+    embed.add_field(name="Expires", value=f"<t:{expire_ts}:R>")
+    embed.set_footer(text="Use /answer to submit your answer!")
+
+    # Send message to the configured channel for the guild
+    channel = client.get_channel(channel_id)
+    if channel:
+        with metrics.timer(metrics.REST_LATENCY, "channel.send", metrics.REST_ERRORS):
             await channel.send(content=trivia_heading, embed=embed)
-        else: 
-            logging.error(f"Could not find configured channel with ID {channel_id} for guild {guild_id}")
-    
+    else: 
+        logging.error(f"Could not find configured channel with ID {channel_id} for guild {guild_id}")
+
 @daily_trivia.before_loop
 async def before_daily_trivia():
     await client.wait_until_ready()
     await asyncio.sleep(60)
 
-@tasks.loop(minutes=10)
+# Safety net only: the expiry scheduler posts results the moment each question expires
+@tasks.loop(minutes=EXPIRY_SAFETY_SWEEP_MINUTES)
 async def check_for_expired_trivia():
-    expired_questions = get_expired_questions()
+    await process_expired_questions()
+
+async def process_expired_questions():
+    # The scheduler and the safety-net sweep can fire together; score each batch only once
+    async with expiry_lock:
+        await score_expired_questions()
+
+async def score_expired_questions():
+    expired_questions = await get_expired_questions(**sharding.db_filter())
+    # Results are announced from the config cache, which may not have loaded at startup
+    if expired_questions and not guild_config_cache.loaded:
+        await load_guild_configs()
     
     for question in expired_questions:
 
-        # Mark the question as processed
-        close_question(question['id'])
+        # Make sure every buffered answer for this question is in the DB before scoring it
+        if answer_buffer and not await answer_buffer.flush(question['id']):
+            logging.error(f"Could not flush buffered answers for question {question['id']}, scoring it next sweep.")
+            continue
 
         logging.info(f"Processing question from user {question["user_id"]}: {question["question"]}")
-        submissions = get_answers_for_question(question['id'])
-        correct_answer = question['answer'].lower().strip()
+        submissions = await get_answers_for_question(question['id'])
+        if submissions is None:
+            # Scoring without the answers would close the question and pay no one
+            logging.error(f"Could not read answers for question {question['id']}, scoring it next sweep.")
+            continue
         max_points = 10 * question['difficulty']
         
         # Lists to categorize results
@@ -389,29 +802,49 @@ async def check_for_expired_trivia():
         partial_credit = []
         losers = []
 
-        for sub in submissions:
-            user_answer = sub['answer']
-            # Determine correctness and points to award
-            is_correct, points_awarded = await check_correct(
-                correct_answer=correct_answer,
-                user_answer=user_answer,
-                question_type=question['question_type'],
-                difficulty=question['difficulty']
-            )
-            
+        # Score every submission first, then write all results at once
+        correct_answer_ids = []
+        points_by_user = {}
+
+        # Determine correctness and points to award for every submission in one batch,
+        # fuzzy-matching each distinct answer only once
+        score_cache = ScoreCache()
+        # Answers were normalized when they were stored; only rows older than that need it here
+        results = await score_normalized_submissions(
+            correct_answers=question['answer_normalized'] or parse_correct_answers(question['answer'], question['question_type']),
+            user_answers=[sub['answer_normalized'] or normalize_answer(sub['answer']) for sub in submissions],
+            question_type=question['question_type'],
+            difficulty=question['difficulty'],
+            cache=score_cache
+        )
+        logging.info(f"Scored {len(submissions)} answers for question {question['id']}: "
+                     f"{score_cache.misses} distinct, {score_cache.hit_rate:.0%} score cache hit rate")
+
+        for sub, (is_correct, points_awarded) in zip(submissions, results):
             # Sort user submissions into winners, partially correct, and losers
             if is_correct:
-                mark_answer_correct(sub['id'])
-                update_leaderboard(question['guild_id'], sub['user_id'], max_points)
+                correct_answer_ids.append(sub['id'])
+                points_by_user[sub['user_id']] = points_by_user.get(sub['user_id'], 0) + max_points
                 winners.append(f"<@{sub['user_id']}>")
             elif points_awarded > 0:
-                update_leaderboard(question['guild_id'], sub['user_id'], points_awarded)
+                points_by_user[sub['user_id']] = points_by_user.get(sub['user_id'], 0) + points_awarded
                 partial_credit.append(f"<@{sub['user_id']}> +{points_awarded}")
             else:
                 losers.append(f"<@{sub['user_id']}>")
 
+        # Mark the question as processed together with its payouts, in one transaction
+        totals = await finalize_question(question['id'], question['guild_id'], correct_answer_ids, points_by_user)
+        if totals is None:
+            continue
+        active_questions.discard(question['guild_id'], question['id'])
+        leaderboards.apply(question['guild_id'], totals)
+        user_stats.invalidate(question['guild_id'], {sub['user_id'] for sub in submissions})
+
         # Announce the results in the set trivia channel
-        channel_id = get_channel_for_guild(question['guild_id'])
+        config = guild_config_cache.get(question['guild_id'])
+        channel_id = config['channel_id'] if config else None
+        if channel_id is None and not guild_config_cache.loaded:
+            channel_id = await get_channel_for_guild(question['guild_id'])
         
         if channel_id:
             channel = client.get_channel(channel_id)
@@ -421,16 +854,7 @@ async def check_for_expired_trivia():
                 results_embed.add_field(name="Correct Answer", value=question['answer'], inline=False)
                 
                 # Get username from user_id of the user who submitted the question
-                authorName = "Unknown Author"
-                authorIcon = None
-                try:
-                    user = await client.fetch_user(question["user_id"])
-                    authorName = user.display_name
-                    authorIcon = user.avatar.url
-                except discord.NotFound:
-                    logging.error(f"User with id {question["user_id"]} not found.")
-                except Exception as e:
-                    logging.error(f"An unexpected error occurred: {e}")
+                authorName, authorIcon = await authors.get(question["user_id"])
                 results_embed.set_author(name=f"{authorName}", icon_url=authorIcon)
 
                 resultsHeading = "### New Trivia Results!"
@@ -452,8 +876,32 @@ async def check_for_expired_trivia():
                 if not submissions:
                     results_embed.add_field(name="🏆 Results", value="No one submitted an answer.", inline=False)
                 
-                await channel.send(content=resultsHeading, embed=results_embed)
+                with metrics.timer(metrics.REST_LATENCY, "channel.send", metrics.REST_ERRORS):
+                    await channel.send(content=resultsHeading, embed=results_embed)
+
+
+async def load_guild_configs():
+    generation = guild_config_cache.generation()
+    configs = await get_all_guild_configs(**sharding.db_filter())
+    if configs is not None and guild_config_cache.load(configs, generation):
+        logging.info(f"Loaded trivia config for {len(configs)} guilds")
+
+async def reload_guild_config(guild_id: int):
+    # Another process's guild is its to post to, so don't even read it
+    if not sharding.owns_guild(guild_id):
+        return
 
+    # Configs are never deleted, so keep the cached one if the read comes back empty
+    config = await get_guild_config(guild_id)
+    if config is not None:
+        guild_config_cache.store(config)
+
+# Optional safety net for guild_config changes made outside the bot
+@tasks.loop(minutes=GUILD_CONFIG_REFRESH_MINUTES or 60)
+async def refresh_guild_configs():
+    # setup_hook has just loaded the configs, so skip the immediate first run
+    if refresh_guild_configs.current_loop > 0:
+        await load_guild_configs()
 
 @check_for_expired_trivia.before_loop
 async def before_check_expired():
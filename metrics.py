@@ -0,0 +1,197 @@
+import os
+import logging
+import functools
+import threading
+import inspect
+from time import perf_counter
+
+# Latency histograms and counters, served in Prometheus text format from a local HTTP
+# endpoint. Off by default: while disabled, timed() hands back the function it was given and
+# timer() a shared no-op context manager, so instrumented code runs as if uninstrumented.
+ENABLED = os.getenv('METRICS_ENABLED', 'false').lower() == 'true'
+HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+PORT = int(os.getenv('METRICS_PORT', '9108'))
+
+# Upper bounds in seconds, from a cached lookup to a slow Discord call
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+
+    def __init__(self, name: str, help_text: str, label: str):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self._lock = threading.Lock()  # db timings are recorded from the executor's threads
+        self._series = {}              # label value -> [bucket counts..., count, sum]
+
+    def observe(self, value: str, seconds: float):
+        with self._lock:
+            series = self._series.get(value)
+            if series is None:
+                series = self._series[value] = [0] * (len(BUCKETS) + 1) + [0.0]
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += seconds
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for value, series in sorted(self._series.items()):
+                label = f'{self.label}="{_escape(value)}"'
+                for bound, count in zip(BUCKETS, series):
+                    lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {count}')
+                lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {series[-2]}')
+                lines.append(f"{self.name}_count{{{label}}} {series[-2]}")
+                lines.append(f"{self.name}_sum{{{label}}} {series[-1]}")
+        return lines
+
+
+class Counter:
+
+    def __init__(self, name: str, help_text: str, label: str):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self._lock = threading.Lock()
+        self._values = {}  # label value -> count
+
+    def inc(self, value: str, amount: int = 1):
+        with self._lock:
+            self._values[value] = self._values.get(value, 0) + amount
+
+    def render(self) -> list[str]:
+        name = f"{self.name}_total"
+        lines = [f"# HELP {name} {self.help_text}", f"# TYPE {name} counter"]
+        with self._lock:
+            for value, count in sorted(self._values.items()):
+                lines.append(f'{name}{{{self.label}="{_escape(value)}"}} {count}')
+        return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+COMMAND_LATENCY = Histogram("nak_command_seconds", "Slash command handling time.", "command")
+COMMAND_ERRORS = Counter("nak_command_errors", "Slash commands that raised an error.", "command")
+DB_LATENCY = Histogram("nak_db_seconds", "db.py function time, excluding executor queueing.", "function")
+DB_ERRORS = Counter("nak_db_errors", "db.py functions that raised.", "function")
+SCORING_LATENCY = Histogram("nak_scoring_seconds", "Answer scoring time.", "function")
+REST_LATENCY = Histogram("nak_discord_rest_seconds", "Discord REST call time, including rate-limit waits.", "call")
+REST_ERRORS = Counter("nak_discord_rest_errors", "Discord REST calls that raised.", "call")
+
+REGISTRY = [COMMAND_LATENCY, COMMAND_ERRORS, DB_LATENCY, DB_ERRORS, SCORING_LATENCY, REST_LATENCY, REST_ERRORS]
+
+
+def render() -> str:
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
+
+
+def timed(histogram: Histogram, name: str, errors: Counter | None = None):
+    # Decorator recording each call's duration under name, for sync and async functions
+    def decorator(func):
+        if not ENABLED:
+            return func
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                start = perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                except Exception:
+                    if errors:
+                        errors.inc(name)
+                    raise
+                finally:
+                    histogram.observe(name, perf_counter() - start)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                if errors:
+                    errors.inc(name)
+                raise
+            finally:
+                histogram.observe(name, perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+class _Timer:
+
+    __slots__ = ('histogram', 'name', 'errors', 'start')
+
+    def __init__(self, histogram: Histogram, name: str, errors: Counter | None):
+        self.histogram = histogram
+        self.name = name
+        self.errors = errors
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.histogram.observe(self.name, perf_counter() - self.start)
+        if exc_type is not None and self.errors:
+            self.errors.inc(self.name)
+        return False
+
+
+class _NullTimer:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+
+def timer(histogram: Histogram, name: str, errors: Counter | None = None):
+    # Context manager timing the block it wraps, e.g. a single Discord REST call
+    return _Timer(histogram, name, errors) if ENABLED else _NULL_TIMER
+
+
+def record_command(name: str, start: float | None, failed: bool = False):
+    # Records a slash command that started at perf_counter() time start, if it was timed
+    if start is not None:
+        COMMAND_LATENCY.observe(name, perf_counter() - start)
+    if failed:
+        COMMAND_ERRORS.inc(name)
+
+
+_runner = None
+
+
+async def start_server():
+    # Serve GET /metrics on HOST:PORT; aiohttp comes with discord.py
+    global _runner
+    if not ENABLED or _runner:
+        return
+    from aiohttp import web
+
+    async def handle_metrics(request):
+        return web.Response(text=render(), headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    _runner = web.AppRunner(app, access_log=None)
+    await _runner.setup()
+    await web.TCPSite(_runner, HOST, PORT).start()
+    logging.info(f"Serving metrics on http://{HOST}:{PORT}/metrics")
+
+
+async def stop_server():
+    global _runner
+    if _runner:
+        await _runner.cleanup()
+        _runner = None
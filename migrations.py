@@ -0,0 +1,249 @@
+import logging
+
+# Arbitrary key for the advisory lock that stops two bot processes migrating at once
+MIGRATION_LOCK_ID = 727_001
+
+# Ordered schema migrations as (version, description, statements). Each version is applied
+# once, in its own transaction, and recorded in schema_migrations. Every statement is
+# idempotent, so databases created before versioning existed upgrade cleanly.
+# Never edit a released migration; append a new version instead.
+MIGRATIONS = [
+    (1, "Base tables", [
+        # Trivia questions table
+        """
+        CREATE TABLE IF NOT EXISTS trivia_questions (
+            id SERIAL PRIMARY KEY,
+            guild_id BIGINT NULL,
+            user_id BIGINT NULL,
+            question_type TEXT CHECK(question_type IN ('TF', 'QA', 'LQ')) NOT NULL,
+            question TEXT NOT NULL,
+            answer TEXT NOT NULL,
+            difficulty INTEGER CHECK(difficulty BETWEEN 1 AND 5),
+            created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+            asked_at TIMESTAMPTZ,
+            expires_at TIMESTAMPTZ,
+            closed BOOLEAN DEFAULT FALSE NOT NULL
+        )
+        """,
+        # User answers table
+        """
+        CREATE TABLE IF NOT EXISTS user_answers (
+            id SERIAL PRIMARY KEY,
+            question_id INTEGER NOT NULL,
+            guild_id BIGINT NOT NULL,
+            user_id BIGINT NOT NULL,
+            answer TEXT NOT NULL,
+            is_correct BOOLEAN DEFAULT FALSE NOT NULL,
+            submitted_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(question_id, user_id),
+            FOREIGN KEY (question_id) REFERENCES trivia_questions(id)
+                ON DELETE CASCADE
+        )
+        """,
+        # Leaderboard table
+        """
+        CREATE TABLE IF NOT EXISTS leaderboard (
+            user_id BIGINT NOT NULL,
+            guild_id BIGINT NOT NULL,
+            points INTEGER DEFAULT 0,
+            PRIMARY KEY (user_id, guild_id)
+        )
+        """,
+        # Guild Configuration table
+        """
+        CREATE TABLE IF NOT EXISTS guild_config (
+            guild_id BIGINT PRIMARY KEY,
+            channel_id BIGINT NOT NULL,
+            mention_role_id BIGINT NULL
+        )
+        """,
+        # Discord Users table
+        """
+        CREATE TABLE IF NOT EXISTS discord_users (
+            user_id BIGINT PRIMARY KEY,
+            display_name TEXT NOT NULL,
+            last_updated TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+    ]),
+    (2, "Shuffled question decks", [
+        # Each guild's questions form a shuffled deck: every question has a random position and
+        # the unasked question with the lowest position is drawn next
+        """
+        ALTER TABLE trivia_questions
+        ADD COLUMN IF NOT EXISTS deck_position DOUBLE PRECISION DEFAULT random() NOT NULL
+        """,
+        # Position of the last question drawn from each guild's deck
+        """
+        CREATE TABLE IF NOT EXISTS trivia_decks (
+            guild_id BIGINT PRIMARY KEY,
+            position DOUBLE PRECISION DEFAULT 0 NOT NULL
+        )
+        """,
+        # Lets pull_random_trivia read the next card straight off the index
+        """
+        CREATE INDEX IF NOT EXISTS trivia_questions_unasked_deck_idx
+        ON trivia_questions (guild_id, deck_position) WHERE asked_at IS NULL
+        """,
+    ]),
+    (3, "Indexes for hot queries", [
+        # get_expired_questions: only open questions are ever swept
+        """
+        CREATE INDEX IF NOT EXISTS trivia_questions_open_expiry_idx
+        ON trivia_questions (expires_at) WHERE closed = FALSE
+        """,
+        # get_active_question: newest asked, still-open question per guild
+        """
+        CREATE INDEX IF NOT EXISTS trivia_questions_active_idx
+        ON trivia_questions (guild_id, asked_at DESC) WHERE closed = FALSE AND asked_at IS NOT NULL
+        """,
+        # get_answers_for_question: covering, so scoring can read answers with an index-only scan
+        """
+        CREATE INDEX IF NOT EXISTS user_answers_question_idx
+        ON user_answers (question_id) INCLUDE (id, user_id, answer)
+        """,
+        # get_leaderboard: top players per guild straight off the index, ties broken by user_id
+        """
+        CREATE INDEX IF NOT EXISTS leaderboard_guild_points_idx
+        ON leaderboard (guild_id, points DESC, user_id)
+        """,
+    ]),
+    (4, "Cached avatars for question authors", [
+        """
+        ALTER TABLE discord_users ADD COLUMN IF NOT EXISTS avatar_url TEXT NULL
+        """,
+    ]),
+    (5, "Normalized answers computed at write time", [
+        # Parsed, normalized answer list; NULL for rows written before this migration
+        """
+        ALTER TABLE trivia_questions ADD COLUMN IF NOT EXISTS answer_normalized TEXT[] NULL
+        """,
+        """
+        ALTER TABLE user_answers ADD COLUMN IF NOT EXISTS answer_normalized TEXT NULL
+        """,
+        # Keep get_answers_for_question covered now that it also reads the normalized answer
+        """
+        DROP INDEX IF EXISTS user_answers_question_idx
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS user_answers_question_normalized_idx
+        ON user_answers (question_id) INCLUDE (id, user_id, answer, answer_normalized)
+        """,
+    ]),
+    (6, "Points ledger and windowed leaderboard rollups", [
+        # One row per award, written by the scoring sweep
+        """
+        CREATE TABLE IF NOT EXISTS points_ledger (
+            id BIGSERIAL PRIMARY KEY,
+            guild_id BIGINT NOT NULL,
+            user_id BIGINT NOT NULL,
+            question_id INTEGER NULL REFERENCES trivia_questions(id) ON DELETE SET NULL,
+            points INTEGER NOT NULL,
+            awarded_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP NOT NULL
+        )
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS points_ledger_guild_awarded_idx
+        ON points_ledger (guild_id, awarded_at)
+        """,
+        # Per-window totals, added to in the same transaction as each ledger insert
+        """
+        CREATE TABLE IF NOT EXISTS leaderboard_rollups (
+            guild_id BIGINT NOT NULL,
+            window_type TEXT CHECK(window_type IN ('week', 'month', 'season')) NOT NULL,
+            window_start DATE NOT NULL,
+            user_id BIGINT NOT NULL,
+            points INTEGER DEFAULT 0 NOT NULL,
+            PRIMARY KEY (guild_id, window_type, window_start, user_id)
+        )
+        """,
+        # Windowed boards, pages and ranks, in the same order as leaderboard_guild_points_idx
+        """
+        CREATE INDEX IF NOT EXISTS leaderboard_rollups_points_idx
+        ON leaderboard_rollups (guild_id, window_type, window_start, points DESC, user_id)
+        """,
+    ]),
+    (7, "Per-user stats aggregates", [
+        # Counters per (guild, user), added to by finalize_question as each question is scored.
+        # current_streak is the run of consecutive correct answers, difficulty_solved the sum
+        # of the difficulties of the questions answered correctly
+        """
+        CREATE TABLE IF NOT EXISTS user_stats (
+            guild_id BIGINT NOT NULL,
+            user_id BIGINT NOT NULL,
+            answered INTEGER DEFAULT 0 NOT NULL,
+            correct INTEGER DEFAULT 0 NOT NULL,
+            points INTEGER DEFAULT 0 NOT NULL,
+            current_streak INTEGER DEFAULT 0 NOT NULL,
+            difficulty_solved INTEGER DEFAULT 0 NOT NULL,
+            PRIMARY KEY (guild_id, user_id)
+        )
+        """,
+        # Backfill from the questions scored so far; the streak counts the correct answers
+        # since each user's most recent miss
+        """
+        WITH scored AS (
+            SELECT a.guild_id, a.user_id, a.is_correct, q.difficulty, q.asked_at
+            FROM user_answers a JOIN trivia_questions q ON q.id = a.question_id
+            WHERE q.closed
+        ), last_miss AS (
+            SELECT guild_id, user_id, MAX(asked_at) AS asked_at
+            FROM scored WHERE NOT is_correct GROUP BY guild_id, user_id
+        )
+        INSERT INTO user_stats (guild_id, user_id, answered, correct, points, current_streak, difficulty_solved)
+        SELECT s.guild_id, s.user_id,
+               COUNT(*),
+               COUNT(*) FILTER (WHERE s.is_correct),
+               COALESCE(MAX(l.points), 0),
+               COUNT(*) FILTER (WHERE s.is_correct AND (m.asked_at IS NULL OR s.asked_at > m.asked_at)),
+               COALESCE(SUM(s.difficulty) FILTER (WHERE s.is_correct), 0)
+        FROM scored s
+        LEFT JOIN last_miss m ON m.guild_id = s.guild_id AND m.user_id = s.user_id
+        LEFT JOIN leaderboard l ON l.guild_id = s.guild_id AND l.user_id = s.user_id
+        GROUP BY s.guild_id, s.user_id
+        ON CONFLICT (guild_id, user_id) DO NOTHING
+        """,
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def run_migrations(connection, target: int = LATEST_VERSION):
+    # Apply every pending migration up to and including target, in order
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+    connection.commit()
+
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INTEGER PRIMARY KEY,
+                    description TEXT NOT NULL,
+                    applied_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            cursor.execute("SELECT version FROM schema_migrations")
+            applied = {row[0] for row in cursor.fetchall()}
+        connection.commit()
+
+        for version, description, statements in MIGRATIONS:
+            if version > target or version in applied:
+                continue
+
+            with connection.cursor() as cursor:
+                for statement in statements:
+                    cursor.execute(statement)
+                cursor.execute(
+                    "INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+                    (version, description)
+                )
+            connection.commit()
+            logging.info(f"Applied migration {version}: {description}")
+    finally:
+        # A failed step leaves the transaction aborted; clear it so the lock can be released
+        connection.rollback()
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID,))
+        connection.commit()
@@ -0,0 +1,57 @@
+import asyncio
+import heapq
+import logging
+from datetime import datetime, timezone
+
+
+class ExpiryScheduler:
+    # Keeps a min-heap of open questions' expires_at and sleeps until the earliest one, so
+    # results are posted as soon as a question expires instead of on the next polling sweep.
+    # on_expiry is the coroutine function that scores and announces expired questions.
+
+    def __init__(self, on_expiry):
+        self.on_expiry = on_expiry
+        self._heap = []  # (expires_at, question_id)
+        self._changed = asyncio.Event()
+        self._task = None
+
+    def schedule(self, question_id: int, expires_at: datetime):
+        heapq.heappush(self._heap, (expires_at, question_id))
+        self._changed.set()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def __len__(self):
+        return len(self._heap)
+
+    async def _run(self):
+        while True:
+            if self._heap:
+                delay = (self._heap[0][0] - datetime.now(timezone.utc)).total_seconds()
+            else:
+                delay = None
+
+            if delay is None or delay > 0:
+                # Sleep until the next expiry, or until an earlier one is scheduled
+                try:
+                    await asyncio.wait_for(self._changed.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                self._changed.clear()
+                continue
+
+            now = datetime.now(timezone.utc)
+            while self._heap and self._heap[0][0] <= now:
+                heapq.heappop(self._heap)
+
+            try:
+                await self.on_expiry()
+            except Exception as e:
+                logging.error(f"Unexpected error while processing expired questions: {e}", exc_info=True)
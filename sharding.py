@@ -0,0 +1,57 @@
+import os
+
+# Gateway sharding. With the defaults the bot runs as one process on one shard. SHARD_COUNT
+# splits guilds across that many shards; SHARD_IDS (e.g. "0-3" or "4,5,6,7") picks the ones
+# this process connects, so launcher.py can spread the shards over several processes.
+
+
+def parse_shard_ids(spec: str | None, shard_count: int) -> list[int]:
+    if not spec:
+        return list(range(shard_count))
+
+    shard_ids = set()
+    for part in spec.split(","):
+        first, _, last = part.strip().partition("-")
+        shard_ids.update(range(int(first), int(last or first) + 1))
+
+    invalid = [shard_id for shard_id in shard_ids if not 0 <= shard_id < shard_count]
+    if invalid:
+        raise ValueError(f"Shard IDs {invalid} are outside 0-{shard_count - 1}")
+    return sorted(shard_ids)
+
+SHARD_COUNT = int(os.getenv('SHARD_COUNT', '1'))
+SHARD_IDS = parse_shard_ids(os.getenv('SHARD_IDS'), SHARD_COUNT)   # Shards owned by this process
+SHARDED = SHARD_COUNT > 1
+
+
+def shard_for_guild(guild_id: int, shard_count: int = SHARD_COUNT) -> int:
+    # The shard Discord delivers a guild's events to
+    return (guild_id >> 22) % shard_count
+
+def owns_guild(guild_id: int) -> bool:
+    return shard_for_guild(guild_id) in SHARD_IDS
+
+def owns_shard(shard_id: int) -> bool:
+    return shard_id in SHARD_IDS
+
+def split_shards(shard_count: int, processes: int) -> list[list[int]]:
+    # Contiguous, near-equal shard ranges, one per process
+    base, extra = divmod(shard_count, processes)
+    ranges, start = [], 0
+    for process in range(processes):
+        end = start + base + (1 if process < extra else 0)
+        ranges.append(list(range(start, end)))
+        start = end
+    return ranges
+
+def client_kwargs() -> dict:
+    # Extra arguments for the bot class when running sharded
+    if not SHARDED:
+        return {}
+    return {'shard_count': SHARD_COUNT, 'shard_ids': SHARD_IDS}
+
+def db_filter() -> dict:
+    # Keyword arguments for the db queries that should only see this process's guilds
+    if not SHARDED or len(SHARD_IDS) == SHARD_COUNT:
+        return {}
+    return {'shard_count': SHARD_COUNT, 'shard_ids': SHARD_IDS}
@@ -1,7 +1,31 @@
 import sys
+import random
+import select
 import asyncio
 import argparse
-from logic import check_correct
+from logic import check_correct, score_submissions
+from sharding import shard_for_guild, split_shards, parse_shard_ids
+from cache import GuildConfigCache
+
+# Pinned scoring results: (correct_answer, user_answer, question_type, difficulty, is_correct, points)
+REGRESSION_CASES = [
+    ("The Beatles", "the beatles", "QA", 3, True, 30),
+    ("The Beatles", "  The Beatles\n", "QA", 3, True, 30),
+    ("The Beatles", "beatles", "QA", 3, False, 0),
+    ("Mississippi", "missisipi", "QA", 2, True, 20),
+    ("True", "true", "TF", 2, True, 20),
+    ("True", "T", "TF", 2, True, 20),
+    ("False", "true", "TF", 2, False, 0),
+    ("red, green, blue", "blue, red, green", "LQ", 3, True, 30),
+    ("red, green, blue", "red, blue", "LQ", 3, False, 20),
+    ("red, green, blue", "red, green", "LQ", 5, False, 32),
+    ("red, green, blue", "red, green, blue, yellow", "LQ", 3, False, 0),
+    ("red, green, blue", "red, red, red", "LQ", 3, False, 10),
+    ("red, green, blue", "grean, bleu, redd", "LQ", 1, False, 3),
+    # An early item must not take the only match a later item has
+    ("north carolina, south carolina", "south carolina, sout carolina", "LQ", 4, True, 40),
+    ("north carolina, south carolina", "sout carolina, south carolina", "LQ", 4, True, 40),
+]
 
 async def main():
 
@@ -16,8 +40,26 @@ async def main():
     parser_check.add_argument('question_type', type=str, help='The type of the question (TF, QA, LQ)')
     parser_check.add_argument('difficulty', type=int, help='The difficulty of the question (1-5)')
 
+    # Parse arguments for running the pinned scoring regression cases
+    subparsers.add_parser('regress', help='Check check_correct() and score_submissions() against pinned results.')
+
+    # Parse arguments for checking that shard ownership partitions guilds across processes
+    parser_shards = subparsers.add_parser('shards', help='Check that every guild is owned by exactly one bot process.')
+    parser_shards.add_argument('--guilds', type=int, default=100_000, help='Random guild IDs to assign.')
+    parser_shards.add_argument('--db', action='store_true', help='Also check the SQL shard filter against Postgres.')
+
+    # Parse arguments for the LISTEN/NOTIFY round trip, which needs DATABASE_URL to point at a Postgres
+    subparsers.add_parser('bus', help='Check that cache invalidation events reach other processes only on commit.')
+
     args = parser.parse_args()
 
+    def receive(listener, timeout: float = 2.0) -> list[dict]:
+        events = []
+        while select.select([listener], [], [], timeout)[0]:
+            events += listener.poll()
+            timeout = 0.2
+        return events
+
 
     match args.command:
         case "check":
@@ -26,6 +68,111 @@ async def main():
             print(f"Points: {points}")
             print(f"Correct: {is_correct}")
             print("----------------------------\n")
+        case "regress":
+            failures = 0
+            for correct_answer, user_answer, question_type, difficulty, *expected in REGRESSION_CASES:
+                single = await check_correct(correct_answer, user_answer, question_type, difficulty)
+                batch = (await score_submissions(correct_answer, [user_answer], question_type, difficulty))[0]
+                for label, result in (("check_correct", single), ("score_submissions", batch)):
+                    if tuple(result) != tuple(expected):
+                        failures += 1
+                        print(f"FAIL {label}({correct_answer!r}, {user_answer!r}, {question_type}, {difficulty}): "
+                              f"got {tuple(result)}, expected {tuple(expected)}")
+            print(f"\n--- Scoring regression: {len(REGRESSION_CASES) * 2 - failures}/{len(REGRESSION_CASES) * 2} passed ---\n")
+            sys.exit(1 if failures else 0)
+        case "shards":
+            failures = 0
+            # Snowflakes for guilds created between 2015 and now, plus the edges of the ID range
+            guild_ids = [random.getrandbits(63) >> random.randint(0, 20) for _ in range(args.guilds)]
+            guild_ids += [0, 1, (1 << 22) - 1, 1 << 22, (1 << 63) - 1]
+            connection = None
+            if args.db:
+                import db
+                connection = db.get_pool().getconn()
+            for shard_count in (1, 2, 3, 8, 16, 17, 64):
+                for processes in sorted({1, 2, 3, min(4, shard_count), shard_count}):
+                    if processes > shard_count:
+                        continue
+                    ranges = split_shards(shard_count, processes)
+                    # Each process gets the shard list launcher.py would pass it in SHARD_IDS
+                    owned = [set(parse_shard_ids(",".join(map(str, shard_ids)), shard_count)) for shard_ids in ranges]
+                    if sorted(shard for shard_ids in owned for shard in shard_ids) != list(range(shard_count)):
+                        failures += 1
+                        print(f"FAIL {shard_count} shards over {processes} processes: shard ranges {ranges} don't cover each shard once")
+                        continue
+                    for guild_id in guild_ids:
+                        shard = shard_for_guild(guild_id, shard_count)
+                        owners = sum(shard in shard_ids for shard_ids in owned)
+                        if owners != 1:
+                            failures += 1
+                            print(f"FAIL guild {guild_id} with {shard_count} shards over {processes} processes: {owners} owners")
+                            break
+
+                    # Every process hears about every guild_config change, by loading or from the
+                    # invalidation bus, but only the owner may cache it or daily_trivia posts twice
+                    configs = [{'guild_id': guild_id, 'channel_id': 1, 'mention_role_id': None} for guild_id in guild_ids[:2000]]
+                    caches = []
+                    for shard_ids in owned:
+                        cache = GuildConfigCache(lambda guild_id, shard_ids=shard_ids: shard_for_guild(guild_id, shard_count) in shard_ids)
+                        cache.load(configs, cache.generation())
+                        for config in configs:
+                            cache.store(config)
+                            cache.set_channel(config['guild_id'], 2)
+                        caches.append({config['guild_id'] for config in cache.all()})
+                    posted = sorted(guild_id for cached in caches for guild_id in cached)
+                    if posted != sorted(config['guild_id'] for config in configs):
+                        failures += 1
+                        print(f"FAIL {shard_count} shards over {processes} processes: guild config caches don't hold each guild exactly once")
+
+                    # The sweeps pick their guilds in SQL, which must agree with shard_for_guild
+                    if connection is None:
+                        continue
+                    sample = guild_ids[:2000] + guild_ids[-5:]
+                    with connection.cursor() as cursor:
+                        for shard_ids in owned:
+                            clause, params = db._shard_clause("guild_id", shard_count, sorted(shard_ids))
+                            cursor.execute(f"SELECT guild_id FROM unnest(%s::BIGINT[]) AS t(guild_id) WHERE TRUE{clause}", (sample, *params))
+                            selected = sorted(row[0] for row in cursor.fetchall())
+                            if selected != sorted(guild_id for guild_id in sample if shard_for_guild(guild_id, shard_count) in shard_ids):
+                                failures += 1
+                                print(f"FAIL {shard_count} shards, shards {sorted(shard_ids)}: SQL shard filter disagrees with shard_for_guild")
+                                break
+            if connection is not None:
+                db.get_pool().putconn(connection)
+            print(f"\n--- Shard partitioning: {'all guilds owned exactly once' if not failures else f'{failures} failures'} ---\n")
+            sys.exit(1 if failures else 0)
+        case "bus":
+            import db
+
+            other = db.InvalidationListener(ignore_origin=None)   # Stands in for another bot process
+            own = db.InvalidationListener()
+            other.connect()
+            own.connect()
+            checks = []
+            try:
+                with db.get_connection() as connection:
+                    with connection.cursor() as cursor:
+                        db.publish_invalidation(cursor, 'question_scored', -1, question_id=1)
+                    connection.rollback()
+                    checks.append(("rolled back event is not delivered", receive(other) == []))
+
+                    with connection.cursor() as cursor:
+                        db.publish_invalidation(cursor, 'question_scored', -1, question_id=2)
+                        checks.append(("event is held until commit", receive(other, 0.5) == []))
+                    connection.commit()
+
+                events = receive(other)
+                checks.append(("committed event is delivered once", [(e['kind'], e['guild_id'], e['question_id']) for e in events] == [('question_scored', -1, 2)]))
+                checks.append(("own events are ignored", receive(own, 0.5) == []))
+            finally:
+                other.close()
+                own.close()
+
+            for label, passed in checks:
+                print(f"{'ok  ' if passed else 'FAIL'} {label}")
+            failures = sum(not passed for _, passed in checks)
+            print(f"\n--- Invalidation bus: {len(checks) - failures}/{len(checks)} passed ---\n")
+            sys.exit(1 if failures else 0)
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,217 @@
+import os
+import csv
+import sys
+import json
+import logging
+import argparse
+
+import psycopg2
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import db
+
+# Columns read on import and written on export. user_id is optional on import
+FIELDS = ('question_type', 'question', 'answer', 'difficulty', 'user_id')
+FORMATS = ('csv', 'jsonl')
+
+IMPORT_BATCH_SIZE = 1000    # Questions written per transaction
+MAX_REPORTED_ERRORS = 20    # Rejected rows listed in a report; the rest are only counted
+TF_ANSWERS = {'true': "True", 't': "True", 'false': "False", 'f': "False"}
+TF_DIFFICULTY = 2           # Matches /addtf, which doesn't ask for a difficulty
+MAX_ID = 2 ** 63 - 1        # Largest Discord ID a BIGINT column holds
+
+
+def detect_format(filename: str) -> str | None:
+    extension = os.path.splitext(filename)[1].lower().lstrip('.')
+    if extension == 'json':
+        extension = 'jsonl'
+    return extension if extension in FORMATS else None
+
+def read_rows(lines, file_format: str):
+    # Yields (line_number, record) one row at a time from any iterable of text lines
+    if file_format == 'csv':
+        reader = csv.DictReader(lines)
+        for record in reader:
+            yield reader.line_num, record
+        return
+
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_number, ValueError(f"invalid JSON ({e.msg})")
+            continue
+        yield line_number, record if isinstance(record, dict) else ValueError("expected a JSON object")
+
+def validate_row(record: dict, default_user_id: int | None = None) -> tuple:
+    # Checks a record against the trivia_questions constraints and returns it as
+    # (user_id, question_type, question, answer, difficulty). Raises ValueError otherwise.
+    def text(field):
+        value = record.get(field)
+        value = str(value).strip() if value is not None else ""
+        if "\x00" in value:
+            # Postgres text can't hold NUL, and psycopg2 would fail the whole batch over it
+            raise ValueError(f"{field} contains a NUL character")
+        return value
+
+    q_type = text('question_type').upper()
+    if q_type not in ('TF', 'QA', 'LQ'):
+        raise ValueError(f"question_type must be TF, QA or LQ, not {q_type or 'empty'}")
+
+    question, answer = text('question'), text('answer')
+    if not question:
+        raise ValueError("question is empty")
+    if not answer:
+        raise ValueError("answer is empty")
+
+    if q_type == 'TF':
+        if answer.lower() not in TF_ANSWERS:
+            raise ValueError(f"TF answer must be True or False, not {answer}")
+        answer = TF_ANSWERS[answer.lower()]
+    elif q_type == 'LQ' and not all(item.strip() for item in answer.split(",")):
+        raise ValueError("LQ answer has an empty item")
+
+    difficulty = text('difficulty') or (str(TF_DIFFICULTY) if q_type == 'TF' else "")
+    try:
+        difficulty = int(difficulty)
+    except ValueError:
+        raise ValueError(f"difficulty must be a whole number, not {difficulty or 'empty'}") from None
+    if not 1 <= difficulty <= 5:
+        raise ValueError(f"difficulty must be between 1 and 5, not {difficulty}")
+
+    user_id = text('user_id')
+    try:
+        user_id = int(user_id) if user_id else default_user_id
+    except ValueError:
+        raise ValueError(f"user_id must be a Discord user ID, not {user_id}") from None
+    if user_id is not None and not 0 < user_id <= MAX_ID:
+        raise ValueError(f"user_id must be a Discord user ID, not {user_id}")
+
+    return user_id, q_type, question, answer, difficulty
+
+def import_questions(guild_id: int, lines, file_format: str, default_user_id: int | None = None,
+                     progress=None, batch_size: int = IMPORT_BATCH_SIZE) -> dict:
+    # Validates and stores every row of an import, batch_size questions per transaction.
+    # progress, if given, is called with the report so far after each batch.
+    if not 0 < guild_id <= MAX_ID:
+        raise ValueError(f"guild_id must be a Discord guild ID, not {guild_id}")
+    if default_user_id is not None and not 0 < default_user_id <= MAX_ID:
+        raise ValueError(f"default user_id must be a Discord user ID, not {default_user_id}")
+    report = {'imported': 0, 'rejected': 0, 'failed': 0, 'errors': []}
+
+    def reject(line_number, reason):
+        report['rejected'] += 1
+        if len(report['errors']) < MAX_REPORTED_ERRORS:
+            report['errors'].append(f"line {line_number}: {reason}")
+
+    def flush(batch):
+        stored = db.store_questions(guild_id, batch)
+        if stored is None:
+            report['failed'] += len(batch)
+        else:
+            report['imported'] += stored
+        if progress:
+            progress(report)
+
+    batch = []
+    try:
+        for line_number, record in read_rows(lines, file_format):
+            if isinstance(record, ValueError):
+                reject(line_number, record)
+                continue
+            try:
+                batch.append(validate_row(record, default_user_id))
+            except ValueError as e:
+                reject(line_number, e)
+                continue
+
+            if len(batch) >= batch_size:
+                flush(batch)
+                batch = []
+    except (csv.Error, UnicodeDecodeError, OSError) as e:
+        report['errors'].append(f"stopped reading the file: {e}")
+
+    if batch:
+        flush(batch)
+    return report
+
+def export_questions(guild_id: int, out, file_format: str) -> int | None:
+    # Writes a guild's question bank to the text stream out as it is read; returns the row
+    # count, or None if a DB error cut the export short and out is incomplete
+    writer = csv.DictWriter(out, fieldnames=FIELDS) if file_format == 'csv' else None
+    if writer:
+        writer.writeheader()
+
+    count = 0
+    try:
+        for row in db.iter_questions(guild_id):
+            record = {field: row[field] for field in FIELDS}
+            if writer:
+                writer.writerow(record)
+            else:
+                out.write(json.dumps(record) + "\n")
+            count += 1
+    except psycopg2.Error as e:
+        logging.error(f"DB error while exporting questions for guild {guild_id} after {count} rows:\n{e}", exc_info=True)
+        return None
+    return count
+
+def format_report(report: dict) -> str:
+    summary = f"Imported {report['imported']} questions, rejected {report['rejected']}"
+    if report['failed']:
+        summary += f", {report['failed']} failed to save"
+    return "\n".join([summary, *report['errors']])
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import and export of a guild's trivia questions.")
+    subparsers = parser.add_subparsers(dest='command', help='The operation to run', required=True)
+
+    parser_import = subparsers.add_parser('import', help='Load questions from a CSV or JSONL file.')
+    parser_import.add_argument('guild_id', type=int, help='Guild the questions belong to.')
+    parser_import.add_argument('path', type=str, help='File to read.')
+    parser_import.add_argument('--format', choices=FORMATS, help='File format (default: from the extension).')
+    parser_import.add_argument('--user-id', type=int, help='Author for rows without a user_id.')
+
+    parser_export = subparsers.add_parser('export', help='Write a guild\'s questions to a CSV or JSONL file.')
+    parser_export.add_argument('guild_id', type=int, help='Guild whose questions to export.')
+    parser_export.add_argument('path', type=str, help='File to write, or - for stdout.')
+    parser_export.add_argument('--format', choices=FORMATS, help='File format (default: from the extension, else jsonl).')
+
+    args = parser.parse_args()
+    if not 0 < args.guild_id <= MAX_ID:
+        parser.error(f"guild_id must be a Discord guild ID, not {args.guild_id}")
+    if getattr(args, 'user_id', None) is not None and not 0 < args.user_id <= MAX_ID:
+        parser.error(f"--user-id must be a Discord user ID, not {args.user_id}")
+    db.init_db()
+
+    match args.command:
+        case "import":
+            file_format = args.format or detect_format(args.path)
+            if file_format is None:
+                parser.error("could not tell the file format from its extension, pass --format")
+
+            def progress(report):
+                print(f"... {report['imported']} imported, {report['rejected']} rejected", file=sys.stderr)
+
+            with open(args.path, newline='', encoding='utf-8') as lines:
+                report = import_questions(args.guild_id, lines, file_format, args.user_id, progress)
+            print(format_report(report))
+            sys.exit(1 if report['failed'] else 0)
+        case "export":
+            file_format = args.format or detect_format(args.path) or 'jsonl'
+            if args.path == "-":
+                count = export_questions(args.guild_id, sys.stdout, file_format)
+            else:
+                with open(args.path, 'w', newline='', encoding='utf-8') as out:
+                    count = export_questions(args.guild_id, out, file_format)
+            if count is None:
+                print("Export failed partway through, the output is incomplete", file=sys.stderr)
+                sys.exit(1)
+            print(f"Exported {count} questions", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,21 @@
 import discord
 from discord.ui import View, button
-from db import store_question
+from async_db import store_question, get_leaderboard_page
 
 # Confirm or cancel the submission of a trivia question
 class ConfirmationView(discord.ui.View):
 
-    def __init__(self, submission_data: dict):
+    def __init__(self, submission_data: dict, duplicates=None):
         super().__init__(timeout=25)
         self.submission_data = submission_data
+        self.duplicates = duplicates  # DuplicateDetector to add the question to once stored
         self.value = None  # Will be True (confirmed), False (cancelled), or None (timeout)
 
     @button(label="Confirm", style=discord.ButtonStyle.green)
     async def confirm(self, interaction: discord.Interaction, button: discord.ui.Button) -> None:
-        store_question(**self.submission_data)
+        question_id = await store_question(**self.submission_data)
+        if question_id is not None and self.duplicates:
+            self.duplicates.add(self.submission_data['guild_id'], question_id, self.submission_data['question'])
 
         await interaction.response.edit_message(content="✅ Submission Confirmed!", view=None, embed=None)
         self.value = True
@@ -23,4 +26,73 @@ class ConfirmationView(discord.ui.View):
 
         await interaction.response.edit_message(content="❌ Submission Cancelled.", view=None, embed=None)
         self.value = False
-        self.stop()
\ No newline at end of file
+        self.stop()
+
+WINDOW_LABELS = {None: "", 'week': " this week", 'month': " this month", 'season': " this season"}
+
+def leaderboard_embed(guild_name: str, entries: list[tuple[int, int]], page: int, page_size: int,
+                      window: str | None = None) -> discord.Embed:
+    # entries are (user_id, points) for one page, page numbers start at 1
+    first_rank = (page - 1) * page_size + 1
+    rankings = [f"**{first_rank + i}.** <@{user_id}> `{points}` points" for i, (user_id, points) in enumerate(entries)]
+
+    title = f"Top {page_size} Nak-Knowers" if page == 1 else "Nak-Knowers"
+    title += f" in {guild_name}{WINDOW_LABELS[window]}"
+    embed = discord.Embed(title=title, description="\n".join(rankings), color=discord.Color.gold())
+    embed.set_footer(text=f"Page {page}")
+    return embed
+
+# Step through leaderboard pages. Each step seeks from the first or last row on screen
+class LeaderboardView(discord.ui.View):
+
+    def __init__(self, guild_id: int, guild_name: str, entries: list[tuple[int, int]], page: int, page_size: int,
+                 window: str | None = None):
+        super().__init__(timeout=180)
+        self.guild_id = guild_id
+        self.guild_name = guild_name
+        self.window = window
+        self.entries = entries
+        self.page = page
+        self.page_size = page_size
+        self.interaction = None  # The command interaction whose response holds this view
+        self._update_buttons()
+
+    def _update_buttons(self):
+        self.previous_page.disabled = self.page <= 1
+        # A short page is the last one. A full page might be too, which the next press finds out
+        self.next_page.disabled = len(self.entries) < self.page_size
+
+    async def _show(self, interaction: discord.Interaction, after=None, before=None, step: int = 0):
+        rows = await get_leaderboard_page(self.guild_id, self.page_size, after=after, before=before, window=self.window)
+        if rows is None:
+            await interaction.response.send_message("Couldn't load that page, please try again.", ephemeral=True)
+            return
+
+        entries = [(row['user_id'], row['points']) for row in rows]
+        if not entries:
+            # Ran off the end of the board, stay where we are
+            self.next_page.disabled = True
+            await interaction.response.edit_message(view=self)
+            return
+
+        self.entries = entries
+        self.page += step
+        self._update_buttons()
+        await interaction.response.edit_message(embed=leaderboard_embed(self.guild_name, self.entries, self.page, self.page_size, self.window), view=self)
+
+    @button(label="Previous", style=discord.ButtonStyle.grey)
+    async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button) -> None:
+        user_id, points = self.entries[0]
+        await self._show(interaction, before=(points, user_id), step=-1)
+
+    @button(label="Next", style=discord.ButtonStyle.grey)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button) -> None:
+        user_id, points = self.entries[-1]
+        await self._show(interaction, after=(points, user_id), step=1)
+
+    async def on_timeout(self) -> None:
+        if self.interaction:
+            try:
+                await self.interaction.edit_original_response(view=None)
+            except discord.HTTPException:
+                pass